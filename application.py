@@ -1,23 +1,89 @@
-from flask import Flask, render_template, request
-from pipeline.prediction_pipeline import hybrid_recommendation
+import math
+from flask import Flask, render_template, request, jsonify, Response
+from pipeline.prediction_pipeline import served_hybrid_recommendation, served_batch_recommendation, recommendation_cache
+from utils.recommender_store import load_store, StoreReloader
+from utils.serving_metrics import serving_metrics
 
 app = Flask(__name__)
 
+# Load all serving artifacts once, before the first request is handled
+store = load_store()
+
+# Swap in newly published artifact bundles in the background, without a restart
+if store.config.get("serving", {}).get("hot_reload", True):
+    # Results cached under the old bundle are dropped as soon as the new one is live
+    reloader = StoreReloader.from_config(store.config, on_swap=[lambda version: recommendation_cache.refresh()]).start()
+    serving_metrics.register_collector(lambda: [
+        ("recommender_artifact_reloads_total", "counter", "Artifact bundles swapped in.", {}, reloader.reloads),
+        ("recommender_artifact_reload_failures_total", "counter", "Artifact bundles that failed to load.", {}, reloader.failures),
+    ])
+
 @app.route('/', methods=['GET', 'POST'])
 def home():
     recommendations = None  # Initialize recommendations as None
 
     if request.method == 'POST':
+        with serving_metrics.request("home"):
+            try:
+                # Extract the user_id from the form
+                user_id = int(request.form['userId'])  # Convert to int for processing
+
+                # Call the hybrid recommendation function
+                recommendations = served_hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4)
+            except Exception as e:
+                serving_metrics.inc("recommender_request_errors_total", endpoint="home")
+                recommendations = [f"An error occurred: {e}"]
+
+    return render_template('index.html', recommendations=recommendations)
+
+# Largest number of users one /api/recommendations request may ask for
+MAX_BATCH_USERS = store.config.get("serving", {}).get("max_batch_users", 1000)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def parse_batch_request(payload):
+    """(user_ids, user_weight, content_weight, n) from a JSON payload; raises ValueError when malformed."""
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object")
+    user_ids = payload.get('user_ids')
+    if not isinstance(user_ids, list) or not all(_is_int(user_id) for user_id in user_ids):
+        raise ValueError("user_ids must be a list of integers")
+    if len(user_ids) > MAX_BATCH_USERS:
+        raise ValueError(f"at most {MAX_BATCH_USERS} user_ids per request")
+    weights = []
+    for name, default in (('user_weight', 0.6), ('content_weight', 0.4)):
+        weight = payload.get(name, default)
+        if not (_is_int(weight) or isinstance(weight, float)) or not math.isfinite(weight):
+            raise ValueError(f"{name} must be a finite number")
+        weights.append(float(weight))
+    n = payload.get('n', 10)
+    if not _is_int(n) or n < 1:
+        raise ValueError("n must be a positive integer")
+    return user_ids, weights[0], weights[1], n
+
+@app.route('/api/recommendations', methods=['POST'])
+def batch_recommendations():
+    with serving_metrics.request("api_recommendations"):
+        payload = request.get_json(silent=True)
+        try:
+            user_ids, user_weight, content_weight, n = parse_batch_request(payload)
+        except ValueError as e:
+            serving_metrics.inc("recommender_request_errors_total", endpoint="api_recommendations")
+            return jsonify({"error": f"Invalid request: {e}"}), 400
+
         try:
-            # Extract the user_id from the form
-            user_id = int(request.form['userId'])  # Convert to int for processing
-            
-            # Call the hybrid recommendation function
-            recommendations = hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4)
+            results = served_batch_recommendation(user_ids, user_weight=user_weight, content_weight=content_weight, n=n)
         except Exception as e:
-            recommendations = [f"An error occurred: {e}"]
+            serving_metrics.inc("recommender_request_errors_total", endpoint="api_recommendations")
+            return jsonify({"error": f"An error occurred: {e}"}), 500
 
-    return render_template('index.html', recommendations=recommendations)
+        return jsonify({"results": results})
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape endpoint: stage latency histograms, request/error counters, cache and coalescer stats
+    return Response(serving_metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -2,6 +2,7 @@ import os
 
 ########################### DATA INGESTION #########################
 
+ARTIFACTS_DIR = "artifacts"
 RAW_DIR = "artifacts/raw"
 CONFIG_PATH = "config/config.yaml"
 
@@ -10,6 +11,7 @@ CONFIG_PATH = "config/config.yaml"
 
 PROCESSED_DIR = "artifacts/processed"
 ANIMELIST_CSV = "artifacts/raw/animelist.csv"
+NEW_RATINGS_CSV = "artifacts/raw/animelist_new.csv"  # Ratings added since the last full run
 
 
 X_TRAIN_ARRAY = os.path.join(PROCESSED_DIR, "X_train_array.pkl")
@@ -23,15 +25,31 @@ USER2USER_DECODED = "artifacts/processed/user2user_decoded.pkl"
 ANIME2ANIME_ENCODED = "artifacts/processed/anime2anime_encoded.pkl"
 ANIME2ANIME_DECODED = "artifacts/processed/anime2anime_decoded.pkl"
 
+RATING_INDEX_DIR = "artifacts/processed/user_ratings"
+ANIME_RATING_INDEX_DIR = "artifacts/processed/anime_ratings"  # Training ratings by anime, for incremental runs
+
+COLUMNAR_DIR = "artifacts/processed/columnar"
+RATINGS_TABLE = os.path.join(COLUMNAR_DIR, "ratings")
+ENCODERS_TABLE = os.path.join(COLUMNAR_DIR, "encoders")
+LIKED_TABLE = os.path.join(COLUMNAR_DIR, "liked")
+
 
 ########################### MODEL TRAINING ################################3
 
 CHECKPOINT_FILE_PATH = './artifacts/model_checkpoint/weights.weights.h5'
+ALS_CHECKPOINT_PATH = './artifacts/model_checkpoint/als_factors.npz'
 MODEL_DIR = './artifacts/model'
 WEIGHTS_DIR = './artifacts/weights'
 MODEL_PATH = './artifacts/model/model.h5'
 WEIGHTS_PATH_USER = './artifacts/weights/user_weights.pkl'
 WEIGHTS_PATH_ANIME = './artifacts/weights/anime_weights.pkl'
+USER_EMBEDDINGS = './artifacts/weights/user_embeddings.npy'
+ANIME_EMBEDDINGS = './artifacts/weights/anime_embeddings.npy'
+ANN_INDEX_USER = './artifacts/weights/user_ann_index.npz'
+ANN_INDEX_ANIME = './artifacts/weights/anime_ann_index.npz'
+ANIME_NEIGHBOUR_IDS = './artifacts/weights/anime_neighbour_ids.npy'
+ANIME_NEIGHBOUR_SCORES = './artifacts/weights/anime_neighbour_scores.npy'
+ANIME_NEIGHBOUR_META = './artifacts/weights/anime_neighbour_meta.json'  # Fingerprint of the weights it was built from
 
 
 ################################## UI APP ##########################333
@@ -41,4 +59,14 @@ DF_PATH = "artifacts/processed/anime_df.csv"
 DF_SYNOPSIS = "artifacts/processed/synopsis_df.csv"
 
 USER_WEIGHTS = "artifacts/weights/user_weights.pkl"
-ANIME_WEIGHTS = "artifacts/weights/anime_weights.pkl"
\ No newline at end of file
+ANIME_WEIGHTS = "artifacts/weights/anime_weights.pkl"
+
+
+################################## BATCH SCORING ##########################
+
+RECOMMENDATIONS_DB = "artifacts/recommendations/recommendations.db"
+
+
+################################## SERVING BUNDLES ##########################
+
+BUNDLES_DIR = "artifacts/bundles"  # Versioned snapshots of the serving artifacts
@@ -0,0 +1,91 @@
+import os
+
+# One BLAS thread per worker process: parallelism comes from the process pool
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+import time
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config.paths_config import *
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.common_functions import read_yaml
+from utils.recommender_store import load_store, live_version
+from utils.recommendation_db import RecommendationDB
+
+logger = get_logger(__name__)
+
+
+def _score_shard(args):
+    """Scores one shard of user ids inside a worker process."""
+    # Imported here so workers share the store the parent loaded before forking
+    from pipeline.prediction_pipeline import batch_hybrid_recommendation
+
+    user_ids, batch_size, user_weight, content_weight, n = args
+    results = []
+    for start in range(0, len(user_ids), batch_size):
+        results.extend(batch_hybrid_recommendation(user_ids[start:start + batch_size], user_weight=user_weight,
+                                                   content_weight=content_weight, n=n))
+    return results
+
+
+class BatchScoring:
+    def __init__(self, config_path):
+        self.config = read_yaml(config_path).get("batch_scoring", {})
+        self.n = self.config.get("n", 10)
+        self.user_weight = self.config.get("user_weight", 0.6)
+        self.content_weight = self.config.get("content_weight", 0.4)
+        self.shard_size = self.config.get("shard_size", 2048)
+        self.batch_size = self.config.get("batch_size", 256)
+        self.workers = self.config.get("workers") or os.cpu_count()
+        logger.info(f"Batch scoring initialized with {self.workers} workers")
+
+    def run(self):
+        """Computes top-N hybrid recommendations for every encoded user and stores them in SQLite."""
+        try:
+            store = load_store()
+            user_ids = np.asarray(list(store.get(USER2USER_ENCODED).keys()), dtype=np.int64)
+            shards = [(user_ids[start:start + self.shard_size].tolist(), self.batch_size,
+                       self.user_weight, self.content_weight, self.n)
+                      for start in range(0, len(user_ids), self.shard_size)]
+
+            # Write to a temporary file and swap it in so readers never see a partial database
+            tmp_path = RECOMMENDATIONS_DB + ".tmp"
+            db = RecommendationDB(tmp_path)
+            db.create({
+                "artifact_version": live_version(),
+                "user_weight": self.user_weight,
+                "content_weight": self.content_weight,
+                "n": self.n,
+                "created_at": time.time(),
+            })
+
+            start = time.perf_counter()
+            scored = 0
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+                for results in executor.map(_score_shard, shards):
+                    db.write(results)
+                    scored += len(results)
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"Scored {scored}/{len(user_ids)} users ({scored / elapsed:.1f} users/s)")
+
+            elapsed = time.perf_counter() - start
+            db.close()
+            os.replace(tmp_path, RECOMMENDATIONS_DB)
+
+            throughput = scored / elapsed if elapsed else 0.0
+            logger.info(f"Batch scoring finished: {scored} users in {elapsed:.2f}s with {self.workers} workers "
+                        f"({throughput:.1f} users/s, {throughput / self.workers:.1f} users/s per worker)")
+            return throughput
+        except Exception as e:
+            logger.error(f"Error during batch scoring: {str(e)}")
+            raise CustomException("Batch scoring failed", e)
+
+
+if __name__ == "__main__":
+    batch_scoring = BatchScoring(config_path=CONFIG_PATH)
+    batch_scoring.run()
@@ -0,0 +1,17 @@
+from config.paths_config import *
+from src.incremental_training import IncrementalTraining
+from src.anime_neighbours import AnimeNeighbours
+from utils.artifact_bundle import publish_bundle
+from utils.common_functions import read_yaml
+
+if __name__ == "__main__":
+    config = read_yaml(CONFIG_PATH)
+
+    incremental_trainer = IncrementalTraining(config_path=CONFIG_PATH, input_file=NEW_RATINGS_CSV)
+    incremental_trainer.run()
+
+    anime_neighbours = AnimeNeighbours(config_path=CONFIG_PATH)
+    anime_neighbours.run()
+
+    # Snapshot the serving artifacts; running servers pick the bundle up on their own
+    publish_bundle(keep=config.get("serving", {}).get("keep_bundles", 3))
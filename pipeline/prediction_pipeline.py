@@ -1,38 +1,185 @@
+import itertools
 from config.paths_config import *
 from utils.helpers import *
+from utils.batch_helpers import *
+from utils.recommender_store import get_store, pinned_store, live_version
+from utils.recommendation_cache import RecommendationCache
+from utils.request_coalescer import RequestCoalescer
+from utils.recommendation_db import RecommendationDB
+from utils.serving_metrics import serving_metrics
 
+recommendation_cache = RecommendationCache.from_config(get_store().config, version_fn=live_version)
+precomputed_recommendations = RecommendationDB(RECOMMENDATIONS_DB)
 
-def hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4):
-    # Step 1: User-Based Recommendation
-    similar_users = find_similar_users(user_id, USER_WEIGHTS, USER2USER_ENCODED, USER2USER_DECODED, n=5, neg=False)
-    user_pref = get_user_preferences(user_id, RATING_DF, DF_PATH)
-    user_recommended_animes = get_top_recommended_animes(similar_users, user_pref, DF_PATH, DF_SYNOPSIS, RATING_DF, n=10)
-    
-    # Extract user-recommended anime names
-    user_recommended_animes_list = user_recommended_animes['anime_name'].tolist()
-    
-    # Step 2: Content-Based Recommendation
-    content_recommended_animes = []
-    for anime in user_recommended_animes_list:
-        similar_animes = find_similar_animes(anime, ANIME_WEIGHTS, ANIME2ANIME_ENCODED, ANIME2ANIME_DECODED, DF_PATH, DF_SYNOPSIS, n=5, neg=False)
-        if similar_animes is not None and not similar_animes.empty:  # Check if the result is valid
-            content_recommended_animes.extend(similar_animes['name'].tolist())  # Adjust column name as needed
-        else:
-            print(f"No similar animes found for: {anime}")
-    
-    # Step 3: Combine Recommendations with Weights
-    combined_scores = {}
-    
-    # Add user-based recommendations with weights
-    for anime in user_recommended_animes_list:
-        combined_scores[anime] = combined_scores.get(anime, 0) + user_weight
-    
-    # Add content-based recommendations with weights
-    for anime in content_recommended_animes:
-        combined_scores[anime] = combined_scores.get(anime, 0) + content_weight
-    
-    # Sort by combined score in descending order
-    sorted_animes = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    # Return top N recommendations
-    return [anime for anime, score in sorted_animes[:10]]
\ No newline at end of file
+
+def _recommendation_names(result, user_id):
+    """Anime names of one batch_hybrid_recommendation result, best first."""
+    if "error" in result:
+        raise KeyError(f"{result['error']}: {user_id}")
+    return [recommendation["name"] for recommendation in result["recommendations"] if recommendation["name"] is not None]
+
+
+def hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4, n=10):
+    """Recommended anime names for one user, scored by the same array stages as batch_hybrid_recommendation."""
+    result = batch_hybrid_recommendation([user_id], user_weight=user_weight, content_weight=content_weight, n=n)[0]
+    return _recommendation_names(result, user_id)
+
+
+def batch_hybrid_recommendation(user_ids, user_weight=0.6, content_weight=0.4, n=10):
+    """Hybrid recommendations for many users through vectorized stages.
+
+    Every stage runs once for the whole batch and carries encoded anime
+    indices with float scores: one GEMM for similar users, one
+    similarity-weighted vote over the neighbours' liked animes, one
+    neighbour lookup for the content-based candidates and one fusion.
+    Each source is scaled so a user's best candidate scores 1 before the
+    weights apply; names are resolved once, for the final top n, and all
+    stages read the same artifact version. Returns one dict per user id
+    with the recommended anime ids, names and per-source scores.
+    """
+    # One store for every stage, even if a new artifact bundle is swapped in meanwhile
+    with pinned_store():
+        n_animes = len(get_store().anime_decoder(ANIME2ANIME_DECODED))
+        with serving_metrics.span("encode_users"):
+            user_rows = encode_users(user_ids, USER2USER_ENCODED)
+            known = np.flatnonzero(user_rows != MISSING)
+        if len(known) < len(user_ids):
+            serving_metrics.inc("recommender_stage_errors_total", len(user_ids) - len(known), stage="encode_users")
+
+        # Step 1: User-Based Recommendation
+        with serving_metrics.span("find_similar_users"):
+            similar_rows, similar_scores = find_similar_users_batch(user_rows[known], USER_WEIGHTS, n=5)
+        with serving_metrics.span("get_top_recommended_animes"):
+            query, user_animes, user_scores = get_top_recommended_animes_batch(user_rows[known], similar_rows, RATING_DF,
+                                                                               n=10, similar_scores=similar_scores)
+
+        # Step 2: Content-Based Recommendation from every user-based pick
+        with serving_metrics.span("find_similar_animes"):
+            content_animes, content_scores = similar_anime_rows(user_animes, ANIME_WEIGHTS, n=5)
+            content_query = np.repeat(query, content_animes.shape[1])
+
+        # Step 3: Combine Recommendations with Weights
+        with serving_metrics.span("fuse_candidates"):
+            pair_query, pair_anime, scores, source_scores = fuse_candidates(
+                [(query, user_animes, user_scores), (content_query, content_animes.ravel(), content_scores.ravel())],
+                [user_weight, content_weight], n_animes)
+            top_query, top_pair, top_scores = segment_top_n(pair_query, np.arange(len(pair_query)), scores, n)
+        with serving_metrics.span("decode_animes"):
+            anime_ids, names = decode_animes(pair_anime[top_pair], ANIME2ANIME_DECODED, DF_PATH)
+
+    results = [{"user_id": int(user_id), "error": "User not found"} for user_id in user_ids]
+    for position in known:
+        results[position] = {"user_id": int(user_ids[position]), "recommendations": []}
+    for q, i, anime_id, name, score in zip(top_query, top_pair, anime_ids, names, top_scores):
+        results[known[q]]["recommendations"].append({
+            "anime_id": int(anime_id),
+            "name": name,
+            "score": float(score),
+            "user_score": float(source_scores[i, 0]),
+            "content_score": float(source_scores[i, 1]),
+        })
+    return results
+
+
+def _recommend_coalesced(requests):
+    """Runs coalesced (user_id, user_weight, content_weight, n) requests, one batch per weight setting."""
+    results = [None] * len(requests)
+    groups = {}
+    for position, (user_id, user_weight, content_weight, n) in enumerate(requests):
+        groups.setdefault((user_weight, content_weight, n), []).append(position)
+
+    for (user_weight, content_weight, n), positions in groups.items():
+        user_ids = [requests[position][0] for position in positions]
+        batch = batch_hybrid_recommendation(user_ids, user_weight=user_weight, content_weight=content_weight, n=n)
+        for position, result in zip(positions, batch):
+            results[position] = result
+    return results
+
+
+request_coalescer = RequestCoalescer.from_config(_recommend_coalesced, get_store().config)
+
+
+def coalesced_hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4, n=10):
+    """Recommended anime names for one user, computed in a micro-batch with concurrent callers."""
+    result = request_coalescer((int(user_id), float(user_weight), float(content_weight), int(n)))
+    return _recommendation_names(result, user_id)
+
+
+def cached_hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4):
+    """hybrid_recommendation behind an LRU/TTL cache keyed on its inputs and the artifact version.
+
+    Cache misses go through the request coalescer when it is enabled in config.yaml.
+    """
+    recommend = hybrid_recommendation
+    if get_store().config.get("coalescer", {}).get("enabled", False):
+        recommend = coalesced_hybrid_recommendation
+
+    key = (int(user_id), float(user_weight), float(content_weight))
+    recommendations = recommendation_cache.get_or_compute(
+        key, lambda: tuple(recommend(user_id, user_weight=user_weight, content_weight=content_weight))
+    )
+    return list(recommendations)
+
+
+def _precomputed_applies(user_weight, content_weight, n):
+    """Whether the batch-scored database matches the live artifacts and the requested settings."""
+    if not precomputed_recommendations.exists():
+        return False
+    metadata = precomputed_recommendations.metadata()
+    return (metadata.get("artifact_version") == recommendation_cache.version
+            and metadata.get("user_weight") == user_weight
+            and metadata.get("content_weight") == content_weight
+            and metadata.get("n", 0) >= n)
+
+
+def served_hybrid_recommendation(user_id, user_weight=0.6, content_weight=0.4):
+    """Recommended anime names from the batch-scored database, scoring live only on a miss."""
+    with serving_metrics.span("precomputed_lookup"):
+        recommendations = None
+        if _precomputed_applies(user_weight, content_weight, 10):
+            recommendations = precomputed_recommendations.get(user_id)
+    if recommendations is not None:
+        serving_metrics.inc("recommender_served_total", source="precomputed")
+        return [recommendation["name"] for recommendation in recommendations if recommendation["name"] is not None]
+    serving_metrics.inc("recommender_served_total", source="live")
+    return cached_hybrid_recommendation(user_id, user_weight=user_weight, content_weight=content_weight)
+
+
+def served_batch_recommendation(user_ids, user_weight=0.6, content_weight=0.4, n=10):
+    """batch_hybrid_recommendation that reads batch-scored users from the database first."""
+    found = {}
+    with serving_metrics.span("precomputed_lookup"):
+        if _precomputed_applies(user_weight, content_weight, n):
+            found = precomputed_recommendations.get_many(user_ids)
+
+    misses = [user_id for user_id in user_ids if int(user_id) not in found]
+    serving_metrics.inc("recommender_served_total", len(user_ids) - len(misses), source="precomputed")
+    serving_metrics.inc("recommender_served_total", len(misses), source="live")
+    live = batch_hybrid_recommendation(misses, user_weight=user_weight, content_weight=content_weight, n=n) if misses else []
+    live = {result["user_id"]: result for result in live}
+
+    return [{"user_id": int(user_id), "recommendations": found[int(user_id)][:n]} if int(user_id) in found
+            else live[int(user_id)] for user_id in user_ids]
+
+
+def _collect_serving_stats():
+    """Recommendation cache, request coalescer and artifact version as scrape-time samples."""
+    cache = recommendation_cache.stats()
+    yield "recommender_cache_entries", "gauge", "Cached recommendation results.", {}, cache["size"]
+    for event in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        yield f"recommender_cache_{event}_total", "counter", f"Recommendation cache {event}.", {}, cache[event]
+
+    coalescer = request_coalescer.stats()
+    for event in ("batches", "requests", "errors"):
+        yield f"recommender_coalescer_{event}_total", "counter", f"Request coalescer {event}.", {}, coalescer[event]
+    batch_sizes = sorted(coalescer["batch_size_counts"].items())
+    cumulative = list(itertools.accumulate(count for _, count in batch_sizes))
+    buckets = [(bound, total) for (bound, _), total in zip(batch_sizes, cumulative) if bound != float("inf")]
+    yield "recommender_coalescer_batch_size", "histogram", "Requests per coalesced batch.", {}, \
+        {"buckets": buckets + [("+Inf", cumulative[-1] if cumulative else 0)], "sum": coalescer["requests"]}
+    yield "recommender_coalescer_queue_delay_max_seconds", "gauge", "Longest wait of a coalesced request.", {}, \
+        coalescer["max_queue_delay_ms"] / 1000
+    yield "recommender_artifact_info", "gauge", "Artifact version being served.", {"version": live_version()}, 1
+
+
+serving_metrics.register_collector(_collect_serving_stats)
@@ -1,15 +1,32 @@
 from config.paths_config import *
 from src.data_ingestion import DataIngestion
 from src.data_processing import DataProcessing
-from src.model_training import ModelTraining
+from src.als_training import ALSTraining
+from src.anime_neighbours import AnimeNeighbours
+from utils.artifact_bundle import publish_bundle
 from utils.common_functions import read_yaml
 
 if __name__ == "__main__":
-    data_ingestion = DataIngestion(read_yaml(CONFIG_PATH))
+    config = read_yaml(CONFIG_PATH)
+
+    data_ingestion = DataIngestion(config)
     data_ingestion.run()
 
-    data_processor = DataProcessing(input_file=ANIMELIST_CSV, output_dir=PROCESSED_DIR)
+    processing_config = config.get("data_processing", {})
+    data_processor = DataProcessing(input_file=ANIMELIST_CSV, output_dir=PROCESSED_DIR,
+                                    chunksize=processing_config.get("chunksize"),
+                                    legacy_artifacts=processing_config.get("legacy_artifacts", True))
     data_processor.process_data()
 
-    model_trainer = ModelTraining(config_path=CONFIG_PATH, data_path=PROCESSED_DIR)
-    model_trainer.train_model()
\ No newline at end of file
+    if config["model"].get("engine", "keras") == "als":
+        model_trainer = ALSTraining(config_path=CONFIG_PATH)
+    else:
+        from src.model_training import ModelTraining  # Only the Keras engine needs TensorFlow
+        model_trainer = ModelTraining(config_path=CONFIG_PATH, data_path=PROCESSED_DIR)
+    model_trainer.train_model()
+
+    anime_neighbours = AnimeNeighbours(config_path=CONFIG_PATH)
+    anime_neighbours.run()
+
+    # Snapshot the serving artifacts; running servers pick the bundle up on their own
+    publish_bundle(keep=config.get("serving", {}).get("keep_bundles", 3))
@@ -0,0 +1,166 @@
+import os
+import time
+import numpy as np
+import scipy.sparse as sp
+from concurrent.futures import ThreadPoolExecutor
+from utils.common_functions import read_yaml
+from utils.columnar import table_exists, read_table, read_schema
+from utils.evaluation import ranking_auc
+from src.custom_exception import CustomException
+from src.logger import get_logger
+from src.weights_export import WeightsExport
+from config.paths_config import *
+import joblib
+
+
+logger = get_logger(__name__)
+
+class ALSTraining:
+    """Alternating least squares over the CSR ratings, a TensorFlow-free alternative to ModelTraining.
+
+    Factors the mean-centred training ratings with weighted-lambda
+    regularization, then exports the row-normalized factors exactly like
+    ModelTraining.extract_weights does. Each half-iteration solves one small
+    ridge regression per user (or anime); blocks of rows are solved on a
+    thread pool since NumPy's matmul and solve release the GIL.
+    """
+
+    def __init__(self, config_path):
+        self.config = read_yaml(config_path)
+        als_config = self.config.get('als', {})
+        self.factors = als_config.get('factors') or self.config['model']['embedding_size']
+        self.regularization = als_config.get('regularization', 0.05)
+        self.iterations = als_config.get('iterations', 10)
+        self.workers = als_config.get('workers') or os.cpu_count()
+        self.block_size = als_config.get('block_size', 1024)
+        self.rating_mean = 0.0
+        logger.info(f"ALS training initialized with {self.factors} factors and {self.workers} workers")
+
+    def load_data(self):
+        """Training and test (user, anime, rating) columns plus the number of users and animes."""
+        try:
+            if table_exists(RATINGS_TABLE):
+                columns, meta = read_table(RATINGS_TABLE, columns=["user", "anime", "rating"])
+                n_train = meta["n_train"]
+                train = [column[:n_train] for column in columns.values()]
+                test = [column[n_train:] for column in columns.values()]
+                encoders = read_schema(ENCODERS_TABLE)["columns"]
+                n_users, n_animes = encoders["user_decoder"]["length"], encoders["anime_decoder"]["length"]
+            else:
+                X_train_array, X_test_array = joblib.load(X_TRAIN_ARRAY), joblib.load(X_TEST_ARRAY)
+                train = X_train_array + [np.asarray(joblib.load(Y_TRAIN))]
+                test = X_test_array + [np.asarray(joblib.load(Y_TEST))]
+                n_users, n_animes = len(joblib.load(USER2USER_ENCODED)), len(joblib.load(ANIME2ANIME_ENCODED))
+            logger.info("Successfully loaded data")
+            return train, test, n_users, n_animes
+        except Exception as e:
+            logger.error("Error while loading data")
+            raise CustomException("Failed to load data", e)
+
+    def _solve_rows(self, matrix, fixed, out, rows):
+        """Least-squares factors for `rows` of `matrix` given the other side's `fixed` factors."""
+        identity = np.eye(self.factors, dtype=np.float32)
+        for row in rows:
+            start, stop = matrix.indptr[row], matrix.indptr[row + 1]
+            if start == stop:
+                continue  # No training ratings, keep the initial factors
+            factors = fixed[matrix.indices[start:stop]]
+            gram = factors.T @ factors + self.regularization * (stop - start) * identity
+            out[row] = np.linalg.solve(gram, factors.T @ matrix.data[start:stop])
+
+    def _solve(self, executor, matrix, fixed, out, rows=None):
+        """Solves every row of `matrix`, or only `rows`, a block of rows per task."""
+        rows = range(matrix.shape[0]) if rows is None else rows
+        blocks = [rows[start:start + self.block_size] for start in range(0, len(rows), self.block_size)]
+        list(executor.map(lambda block: self._solve_rows(matrix, fixed, out, block), blocks))
+
+    def init_factors(self, n_rows, seed=0):
+        return (0.01 * np.random.default_rng(seed).standard_normal((n_rows, self.factors))).astype(np.float32)
+
+    def fit(self, user, anime, rating, n_users, n_animes, init=None, iterations=None):
+        """Returns raw (user_factors, anime_factors) fitted to the given ratings.
+
+        `init` warm-starts from earlier (user_factors, anime_factors) of the same shapes.
+        """
+        iterations = iterations or self.iterations
+        rating = np.asarray(rating, dtype=np.float32)
+        self.rating_mean = float(rating.mean())  # Saved with the factors, which model rating - mean
+        centred = rating - self.rating_mean
+        by_user = sp.csr_matrix((centred, (np.asarray(user), np.asarray(anime))), shape=(n_users, n_animes))
+        by_anime = by_user.T.tocsr()
+
+        if init is None:
+            user_factors, anime_factors = self.init_factors(n_users), self.init_factors(n_animes, seed=1)
+        else:
+            user_factors, anime_factors = (np.array(factors, dtype=np.float32) for factors in init)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for iteration in range(iterations):
+                start = time.perf_counter()
+                self._solve(executor, by_user, anime_factors, user_factors)
+                self._solve(executor, by_anime, user_factors, anime_factors)
+                logger.info(f"ALS iteration {iteration + 1}/{iterations} took {time.perf_counter() - start:.2f}s")
+        return user_factors, anime_factors
+
+    def refit_rows(self, user_ratings, anime_ratings, user_factors, anime_factors, user_rows, anime_rows, iterations=1):
+        """Re-solves only `user_rows` and `anime_rows` in place, every other factor staying fixed.
+
+        `user_ratings` and `anime_ratings` are (user, anime, rating) arrays
+        holding every rating of `user_rows` and of `anime_rows` respectively;
+        they are centred with the mean the factors were fitted with
+        (`self.rating_mean`). Each iteration solves the users against the
+        anime factors, then the animes against the updated users.
+        """
+        n_users, n_animes = len(user_factors), len(anime_factors)
+
+        def matrix(row, column, rating, shape):
+            centred = np.asarray(rating, dtype=np.float32) - np.float32(self.rating_mean)
+            return sp.csr_matrix((centred, (np.asarray(row), np.asarray(column))), shape=shape)
+
+        by_user = matrix(*user_ratings, shape=(n_users, n_animes))
+        user, anime, rating = anime_ratings
+        by_anime = matrix(anime, user, rating, shape=(n_animes, n_users))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for iteration in range(iterations):
+                start = time.perf_counter()
+                self._solve(executor, by_user, anime_factors, user_factors, rows=user_rows)
+                self._solve(executor, by_anime, user_factors, anime_factors, rows=anime_rows)
+                logger.info(f"ALS refit of {len(user_rows)} users and {len(anime_rows)} animes, "
+                            f"iteration {iteration + 1}/{iterations} took {time.perf_counter() - start:.2f}s")
+        return user_factors, anime_factors
+
+    def save_factors(self, user_factors, anime_factors):
+        """Keeps the raw factors and the rating mean they model so incremental runs can warm-start from them."""
+        os.makedirs(os.path.dirname(ALS_CHECKPOINT_PATH), exist_ok=True)
+        np.savez(ALS_CHECKPOINT_PATH, user_factors=user_factors, anime_factors=anime_factors,
+                 rating_mean=self.rating_mean)
+
+    @staticmethod
+    def normalize(weights):
+        """Row-normalize factors the same way ModelTraining.extract_weights does."""
+        return weights / np.linalg.norm(weights, axis=1).reshape((-1, 1))
+
+    def train_model(self):
+        """Fits ALS factors and saves them in every format the serving path reads."""
+        try:
+            start = time.perf_counter()
+            (user, anime, rating), test, n_users, n_animes = self.load_data()
+            user_factors, anime_factors = self.fit(user, anime, rating, n_users, n_animes)
+            self.save_factors(user_factors, anime_factors)
+            user_weights, anime_weights = self.normalize(user_factors), self.normalize(anime_factors)
+            logger.info(f"ALS training completed in {time.perf_counter() - start:.2f}s")
+
+            auc = ranking_auc(user_weights, anime_weights, *test)
+            logger.info(f"Held-out ranking AUC: {auc:.4f}")
+        except CustomException:
+            raise
+        except Exception as e:
+            logger.error(f"Error during ALS training: {str(e)}")
+            raise CustomException("ALS training failed", e)
+
+        WeightsExport(self.config).export(user_weights, anime_weights)
+
+
+if __name__ == "__main__":
+    als_trainer = ALSTraining(config_path=CONFIG_PATH)
+    als_trainer.train_model()
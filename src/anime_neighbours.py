@@ -0,0 +1,35 @@
+import os
+import joblib
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.common_functions import read_yaml
+from utils.neighbour_table import NeighbourTable, weights_fingerprint
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+class AnimeNeighbours:
+    def __init__(self, config_path):
+        self.config = read_yaml(config_path).get("neighbours", {})
+        self.top_k = self.config.get("top_k", 50)
+        self.block_size = self.config.get("block_size", 1024)
+        logger.info(f"Anime neighbour stage initialized with top_k={self.top_k}")
+
+    def run(self):
+        """Precomputes the top-K similar animes for every encoded anime."""
+        try:
+            anime_weights = joblib.load(WEIGHTS_PATH_ANIME)
+            table = NeighbourTable.build(anime_weights, top_k=self.top_k, block_size=self.block_size)
+            table.meta = {"weights_fingerprint": weights_fingerprint(WEIGHTS_PATH_ANIME)}
+
+            os.makedirs(WEIGHTS_DIR, exist_ok=True)
+            table.save(ANIME_NEIGHBOUR_IDS, ANIME_NEIGHBOUR_SCORES, ANIME_NEIGHBOUR_META)
+            logger.info("Anime neighbour table completed successfully")
+        except Exception as e:
+            logger.error(f"Error while computing anime neighbours: {str(e)}")
+            raise CustomException("Failed to compute anime neighbours", e)
+
+
+if __name__ == "__main__":
+    anime_neighbours = AnimeNeighbours(config_path=CONFIG_PATH)
+    anime_neighbours.run()
@@ -1,11 +1,14 @@
 from tensorflow.keras.models import Model
 from tensorflow.keras.layers import Input, Embedding, Dot, Flatten, Dense, BatchNormalization, Activation
 from utils.common_functions import read_yaml  # Importing read_yaml from your utils directory
+from utils.lazy_adam import LazyAdam
 from src.custom_exception import CustomException
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
+PRECISIONS = ("float32", "mixed_bfloat16")
+
 class BaseModel:
     def __init__(self, config_path):
         try:
@@ -15,10 +18,25 @@ class BaseModel:
             logger.error(f"Error loading configuration from {config_path}: {str(e)}")
             raise CustomException(f"Error loading configuration from {config_path}", e)
     
-    def RecommenderNet(self, n_users, n_animes):
-        """Defines the recommender model."""
+    def get_optimizer(self, name=None):
+        """Optimizer named in the config; LazyAdam updates only the embedding rows seen in a batch."""
+        name = name or self.config['model']['optimizer']
+        if name == "LazyAdam":
+            return LazyAdam()
+        return name
+
+    def RecommenderNet(self, n_users, n_animes, optimizer=None):
+        """Defines the recommender model.
+
+        `model.precision: mixed_bfloat16` computes in bfloat16 while keeping
+        float32 variables and a float32 output; `model.jit_compile` controls
+        XLA compilation of the training step.
+        """
         try:
             embedding_size = self.config['model']['embedding_size']
+            policy = self.config['model'].get('precision', 'float32')
+            if policy not in PRECISIONS:
+                raise ValueError(f"Unsupported precision {policy}, expected one of {PRECISIONS}")
             
             # Input layers
             user = Input(name='user', shape=[1])
@@ -28,30 +46,33 @@ class BaseModel:
             user_embedding = Embedding(
                 name='user_embedding',
                 input_dim=n_users, 
-                output_dim=embedding_size
+                output_dim=embedding_size,
+                dtype=policy
             )(user)
             
             anime_embedding = Embedding(
                 name='anime_embedding',
                 input_dim=n_animes, 
-                output_dim=embedding_size
+                output_dim=embedding_size,
+                dtype=policy
             )(anime)
             
             # Dot product for similarity
-            x = Dot(name='dot_product', normalize=True, axes=2)([user_embedding, anime_embedding])
-            x = Flatten()(x)
+            x = Dot(name='dot_product', normalize=True, axes=2, dtype=policy)([user_embedding, anime_embedding])
+            x = Flatten(dtype=policy)(x)
             
             # Dense layer
-            x = Dense(1, kernel_initializer='he_normal')(x)
-            x = BatchNormalization()(x)
-            x = Activation("sigmoid")(x)
+            x = Dense(1, kernel_initializer='he_normal', dtype=policy)(x)
+            x = BatchNormalization(dtype=policy)(x)
+            x = Activation("sigmoid", dtype="float32")(x)  # Loss is always computed in float32
             
             # Compile model
             model = Model(inputs=[user, anime], outputs=x)
             model.compile(
                 loss=self.config['model']['loss'], 
-                optimizer=self.config['model']['optimizer'], 
-                metrics=self.config['model']['metrics']
+                optimizer=self.get_optimizer(optimizer), 
+                metrics=self.config['model']['metrics'],
+                jit_compile=self.config['model'].get('jit_compile', 'auto')
             )
             
             logger.info("Model created successfully")
@@ -1,10 +1,12 @@
 import os
+import time
 import pandas as pd
-from google.cloud import storage
+from concurrent.futures import ThreadPoolExecutor
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from config.paths_config import *
 from utils.common_functions import read_yaml
+from utils.local_bucket import LocalBucket
 
 logger = get_logger(__name__)
 
@@ -13,39 +15,96 @@ class DataIngestion:
         self.config = config["data_ingestion"]
         self.bucket_name = self.config["bucket_name"]
         self.file_names = self.config["bucket_file_names"]
+        self.row_limit = self.config.get("row_limit", 5000000)
+        self.row_limited_files = self.config.get("row_limited_files", ["animelist.csv"])
+        self.streamable_files = self.config.get("streamable_files", ["animelist.csv"])
+        self.local_bucket_dir = self.config.get("local_bucket_dir")
+        self.max_workers = self.config.get("max_workers") or len(self.file_names)
+        self.chunk_size = self.config.get("chunk_size", 8 * 1024 * 1024)
 
         # Create the 'artifacts' directory and 'raw' subdirectory
         os.makedirs(os.path.join('artifacts', 'raw'), exist_ok=True)
 
         logger.info(f"Data Ingestion started with {self.bucket_name} and files are {', '.join(self.file_names)}")
 
+    def get_bucket(self):
+        """Returns the GCP bucket, or a directory-backed stand-in when local_bucket_dir is set."""
+        if self.local_bucket_dir:
+            logger.info(f"Using local bucket stand-in at {self.local_bucket_dir}")
+            return LocalBucket(self.local_bucket_dir)
+        from google.cloud import storage
+        return storage.Client().bucket(self.bucket_name)
+
+    def stream_head(self, blob, file_path, max_rows):
+        """Streams a CSV blob to disk, stopping after the header and `max_rows` rows.
+
+        Rows are counted by newlines as the bytes arrive, so the file is never
+        parsed and at most one chunk is held in memory. Only valid for files
+        without quoted newlines (e.g. animelist.csv's numeric columns); a
+        multi-line field such as a synopsis would be cut at the wrong row.
+        """
+        remaining = max_rows + 1  # header line
+        written = 0
+        with blob.open("rb", chunk_size=self.chunk_size) as source, open(file_path, "wb") as target:
+            while remaining > 0:
+                chunk = source.read(self.chunk_size)
+                if not chunk:
+                    break
+                newlines = chunk.count(b"\n")
+                if newlines >= remaining:
+                    # Cut right after the last newline we want to keep
+                    end = -1
+                    for _ in range(remaining):
+                        end = chunk.index(b"\n", end + 1)
+                    chunk = chunk[:end + 1]
+                    newlines = remaining
+                target.write(chunk)
+                written += len(chunk)
+                remaining -= newlines
+        return max_rows + 1 - remaining - 1, written
+
+    def download_file(self, bucket, file_name):
+        file_path = os.path.join('artifacts', 'raw', file_name)
+        tmp_path = file_path + ".part"
+        blob = bucket.blob(file_name)
+        start = time.perf_counter()
+
+        # If the file is row limited (animelist.csv), keep only the first `row_limit` rows
+        if file_name in self.row_limited_files and self.row_limit and file_name in self.streamable_files:
+            rows, size = self.stream_head(blob, tmp_path, self.row_limit)
+            os.replace(tmp_path, file_path)
+            elapsed = time.perf_counter() - start
+            logger.info(f"{rows} rows of {file_name} streamed to {file_path} "
+                        f"({size / 1e6:.1f} MB in {elapsed:.2f}s, {size / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+        elif file_name in self.row_limited_files and self.row_limit:
+            # Fields may span lines, so the CSV parser decides where row `row_limit` ends
+            blob.download_to_filename(tmp_path)
+            pd.read_csv(tmp_path, nrows=self.row_limit).to_csv(file_path, index=False)
+            os.remove(tmp_path)
+            logger.info(f"{self.row_limit} rows of {file_name} saved to {file_path} "
+                        f"in {time.perf_counter() - start:.2f}s")
+        else:
+            # For other files, download them entirely
+            blob.download_to_filename(tmp_path)
+            os.replace(tmp_path, file_path)
+            size = os.path.getsize(file_path)
+            elapsed = time.perf_counter() - start
+            logger.info(f"CSV file '{file_name}' successfully downloaded to {file_path} "
+                        f"({size / 1e6:.1f} MB in {elapsed:.2f}s)")
+        return file_path
+
     def download_csv_from_gcp(self):
         try:
-            client = storage.Client()
-            bucket = client.bucket(self.bucket_name)
-
-            # Loop through the files to download them
-            for file_name in self.file_names:
-                file_path = os.path.join('artifacts', 'raw', file_name)
-                
-                # If the file is 'animelist.csv', we download only the first 50 lakh rows
-                if file_name == "animelist.csv":
-                    blob = bucket.blob(file_name)
-                    blob.download_to_filename(file_path)
-                    
-                    # Read only the first 50 lakh rows from 'animelist.csv'
-                    logger.info(f"Large file {file_name} downloaded, now reading the first 50 lakh rows.")
-                    data = pd.read_csv(file_path, nrows=5000000)  # Read only 5 million rows
-                    
-                    # Save the first 50 lakh rows to the same file path
-                    data.to_csv(file_path, index=False)
-                    logger.info(f"50 Lakh rows of {file_name} saved to {file_path}")
-
-                else:
-                    # For other files, download them entirely
-                    blob = bucket.blob(file_name)
-                    blob.download_to_filename(file_path)
-                    logger.info(f"CSV file '{file_name}' successfully downloaded to {file_path}")
+            bucket = self.get_bucket()
+            start = time.perf_counter()
+
+            # Download all files concurrently
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self.download_file, bucket, file_name) for file_name in self.file_names]
+                for future in futures:
+                    future.result()
+
+            logger.info(f"Downloaded {len(self.file_names)} files in {time.perf_counter() - start:.2f}s")
 
         except Exception as e:
             logger.error("Error while downloading the CSV files")
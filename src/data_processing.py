@@ -1,4 +1,5 @@
 import os
+import time
 import pandas as pd
 import numpy as np
 import joblib
@@ -6,16 +7,34 @@ from sklearn.model_selection import train_test_split
 from src.custom_exception import CustomException
 from src.logger import get_logger
 from config.paths_config import *
+from utils.rating_index import UserRatingIndex, AnimeRatingIndex
+from utils.liked_matrix import LikedMatrix
+from utils.columnar import write_table, dense_encoder
 import sys
 
 # Initialize logger
 logger = get_logger(__name__)
 
+# Typed columns of the columnar ratings table
+RATING_COLUMNS = {"user_id": np.int32, "anime_id": np.int32, "rating": np.float32,
+                  "user": np.int32, "anime": np.int32}
+
 class DataProcessing:
-    def __init__(self, input_file, output_dir):
+    def __init__(self, input_file, output_dir, chunksize=None, legacy_artifacts=True):
         self.input_file = input_file
         self.output_dir = output_dir
+        self.chunksize = chunksize  # Rows per chunk; enables the out-of-core mode when set
+        self.legacy_artifacts = legacy_artifacts  # Also write the pickles and rating_df.csv
+        # Columnar tables and the rating index, laid out under output_dir like under PROCESSED_DIR
+        self.encoders_table = self._output_path(ENCODERS_TABLE)
+        self.ratings_table = self._output_path(RATINGS_TABLE)
+        self.liked_table = self._output_path(LIKED_TABLE)
+        self.rating_index_dir = self._output_path(RATING_INDEX_DIR)
+        self.anime_index_dir = self._output_path(ANIME_RATING_INDEX_DIR)
         self.rating_df = None
+        self.rating_range = None  # Raw (min, max) rating used for scaling
+        self.user_ids = None  # Raw id of each encoded user / anime
+        self.anime_ids = None
         self.user2user_encoded = {}
         self.user2user_decoded = {}
         self.anime2anime_encoded = {}
@@ -25,11 +44,16 @@ class DataProcessing:
         self.y_train = None
         self.y_test = None
         self.anime_df = None
+        self.stage_timings = {}
         
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
         logger.info("DataProcessing instance initialized.")
 
+    def _output_path(self, path):
+        """`path` from paths_config, moved from PROCESSED_DIR into this instance's output_dir."""
+        return os.path.join(self.output_dir, os.path.relpath(path, PROCESSED_DIR))
+
     def load_data(self, usecols):
         """Loads the data from the CSV file."""
         try:
@@ -52,7 +76,8 @@ class DataProcessing:
         try:
             min_rating = self.rating_df['rating'].min()
             max_rating = self.rating_df['rating'].max()
-            self.rating_df['rating'] = self.rating_df["rating"].apply(lambda x: (x - min_rating) / (max_rating - min_rating)).values.astype(np.float64)
+            self.rating_range = (float(min_rating), float(max_rating))
+            self.rating_df['rating'] = ((self.rating_df['rating'] - min_rating) / (max_rating - min_rating)).values.astype(np.float64)
             logger.info(f"Ratings scaled between 0 and 1.")
         except Exception as e:
             raise CustomException("Error during rating scaling.", sys)
@@ -60,15 +85,14 @@ class DataProcessing:
     def encode_data(self):
         """Encodes user IDs and anime IDs into numerical values."""
         try:
-            user_ids = self.rating_df["user_id"].unique().tolist()
-            self.user2user_encoded = {x: i for i, x in enumerate(user_ids)}
-            self.user2user_decoded = {i: x for i, x in enumerate(user_ids)}
-            self.rating_df["user"] = self.rating_df["user_id"].map(self.user2user_encoded)
+            # factorize numbers ids in order of first appearance, same as unique()
+            user_codes, user_ids = pd.factorize(self.rating_df["user_id"])
+            self.user_ids = np.asarray(user_ids, dtype=np.int64)
+            self.rating_df["user"] = user_codes.astype(np.int64)
             
-            anime_ids = self.rating_df["anime_id"].unique().tolist()
-            self.anime2anime_encoded = {x: i for i, x in enumerate(anime_ids)}
-            self.anime2anime_decoded = {i: x for i, x in enumerate(anime_ids)}
-            self.rating_df["anime"] = self.rating_df["anime_id"].map(self.anime2anime_encoded)
+            anime_codes, anime_ids = pd.factorize(self.rating_df["anime_id"])
+            self.anime_ids = np.asarray(anime_ids, dtype=np.int64)
+            self.rating_df["anime"] = anime_codes.astype(np.int64)
             logger.info("User and anime encoding completed.")
         except Exception as e:
             raise CustomException("Error during user and anime encoding.", sys)
@@ -97,8 +121,55 @@ class DataProcessing:
             raise CustomException("Error during data splitting.", sys)
 
     def save_artifacts(self):
-        """Saves encoded mappings and processed data for later use."""
+        """Saves the columnar tables, the user and anime rating indexes and, if enabled, the legacy files."""
         try:
+            self.save_encoders()
+            if self.rating_df is not None:
+                columns = {name: self.rating_df[name].to_numpy() for name in RATING_COLUMNS}
+                self.save_rating_table(columns, n_train=len(self.y_train))
+
+                self.save_rating_index(UserRatingIndex.from_frame(self.rating_df))
+                train = self.rating_df[:len(self.y_train)]
+                AnimeRatingIndex.from_arrays(train["user"], train["anime"], train["rating"],
+                                             n_animes=len(self.anime_ids)).save(self.anime_index_dir)
+
+            if self.legacy_artifacts:
+                self.save_legacy_artifacts()
+            logger.info("Processed data saved successfully.")
+        except CustomException:
+            raise
+        except Exception as e:
+            raise CustomException("Error during artifact saving.", sys)
+
+    def save_encoders(self):
+        """Saves the id decoders and their dense direct-address encoders as one columnar table."""
+        write_table(self.encoders_table, {
+            "user_decoder": self.user_ids,
+            "user_encoder": dense_encoder(self.user_ids),
+            "anime_decoder": self.anime_ids,
+            "anime_encoder": dense_encoder(self.anime_ids),
+        }, dtypes={"user_decoder": np.int32, "anime_decoder": np.int32})
+
+    def save_rating_table(self, columns, n_train):
+        """Saves the shuffled ratings as typed columns; the first n_train rows are the training split."""
+        write_table(self.ratings_table, columns, dtypes=RATING_COLUMNS, n_train=int(n_train),
+                    rating_min=self.rating_range[0], rating_max=self.rating_range[1])
+
+    def save_rating_index(self, rating_index):
+        """Saves the per-user CSR rating index and the liked matrix derived from it, both read at serve time."""
+        rating_index.save(self.rating_index_dir)
+        self.save_liked_matrix(rating_index)
+
+    def save_liked_matrix(self, rating_index):
+        LikedMatrix.from_rating_index(rating_index, n_animes=len(self.anime_ids)).save(self.liked_table)
+
+    def save_legacy_artifacts(self):
+        """Saves the pickled mappings and splits, and rating_df.csv, read by older code."""
+        try:
+            self.user2user_encoded = dict(zip(self.user_ids.tolist(), range(len(self.user_ids))))
+            self.user2user_decoded = dict(enumerate(self.user_ids.tolist()))
+            self.anime2anime_encoded = dict(zip(self.anime_ids.tolist(), range(len(self.anime_ids))))
+            self.anime2anime_decoded = dict(enumerate(self.anime_ids.tolist()))
             artifacts = {
                 "user2user_encoded": self.user2user_encoded,
                 "user2user_decoded": self.user2user_decoded,
@@ -109,16 +180,198 @@ class DataProcessing:
                 joblib.dump(data, os.path.join(self.output_dir, f"{name}.pkl"))
                 logger.info(f"{name} saved successfully.")
 
-            joblib.dump(self.X_train_array, X_TRAIN_ARRAY)
-            joblib.dump(self.X_test_array, X_TEST_ARRAY)
-            joblib.dump(self.y_train, Y_TRAIN)
-            joblib.dump(self.y_test, Y_TEST)
+            joblib.dump(self.X_train_array, self._output_path(X_TRAIN_ARRAY))
+            joblib.dump(self.X_test_array, self._output_path(X_TEST_ARRAY))
+            joblib.dump(self.y_train, self._output_path(Y_TRAIN))
+            joblib.dump(self.y_test, self._output_path(Y_TEST))
             
-            # Save the rating DataFrame
-            self.rating_df.to_csv(os.path.join(self.output_dir, "rating_df.csv"), index=False)
-            logger.info("Processed data and rating DataFrame saved successfully.")
+            if self.rating_df is not None:
+                # Save the rating DataFrame
+                self.rating_df.to_csv(os.path.join(self.output_dir, "rating_df.csv"), index=False)
+            logger.info("Legacy pickles and rating DataFrame saved successfully.")
         except Exception as e:
-            raise CustomException("Error during artifact saving.", sys)
+            raise CustomException("Error during legacy artifact saving.", sys)
+
+    ############################ OUT-OF-CORE MODE ############################
+
+    @staticmethod
+    def _grow(array, size, fill):
+        """Extends a dense per-id array so that index `size - 1` is valid."""
+        if size <= len(array):
+            return array
+        grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _read_chunks(self, usecols):
+        return pd.read_csv(self.input_file, usecols=usecols, chunksize=self.chunksize)
+
+    def scan_users(self, usecols):
+        """First streaming pass: per-user rating counts and per-user rating min/max."""
+        try:
+            counts = np.zeros(0, dtype=np.int64)
+            user_min = np.zeros(0, dtype=np.float64)
+            user_max = np.zeros(0, dtype=np.float64)
+            n_rows = 0
+            for chunk in self._read_chunks(usecols):
+                users = chunk["user_id"].to_numpy(dtype=np.int64)
+                ratings = chunk["rating"].to_numpy(dtype=np.float64)
+                size = int(users.max()) + 1
+                counts = self._grow(counts, size, 0)
+                user_min = self._grow(user_min, size, np.inf)
+                user_max = self._grow(user_max, size, -np.inf)
+
+                counts[:size] += np.bincount(users, minlength=size)
+                np.minimum.at(user_min, users, ratings)
+                np.maximum.at(user_max, users, ratings)
+                n_rows += len(chunk)
+
+            logger.info(f"Scanned {n_rows} ratings from {self.input_file} in chunks of {self.chunksize}.")
+            return counts, user_min, user_max
+        except Exception as e:
+            raise CustomException(f"Failed to scan data from {self.input_file}", sys)
+
+    def process_data_chunked(self, usecols, min_ratings=400, test_set_size=1000, random_state=73):
+        """Produces the same artifacts as the in-memory pipeline in two streaming passes.
+
+        Pass one counts ratings and tracks rating min/max per user. Pass two
+        filters, scales and encodes each chunk into disk-backed columns, which
+        are then gathered block by block into the order of
+        `sample(frac=1, random_state=random_state)` and counting-sorted by
+        user into the CSR index and by anime into the training-split anime
+        index. Every full-length array, the shuffle
+        permutation included, is a memory-mapped scratch file; memory holds
+        one chunk plus the per-user and per-anime id arrays; the legacy
+        pickles and rating_df.csv are streamed from the scratch files too.
+        """
+        try:
+            counts, user_min, user_max = self.scan_users(usecols)
+            keep_user = counts >= min_ratings
+            n_rows = int(counts[keep_user].sum())
+            min_rating = user_min[keep_user].min()
+            max_rating = user_max[keep_user].max()
+            self.rating_range = (float(min_rating), float(max_rating))
+            logger.info(f"Filtered users with at least {min_ratings} ratings. Remaining rows: {n_rows}")
+
+            scratch_dir = os.path.join(self.output_dir, "_chunked")
+            os.makedirs(scratch_dir, exist_ok=True)
+            dtypes = [("user_id", np.int64), ("anime_id", np.int64), ("rating", np.float64),
+                      ("user", np.int64), ("anime", np.int64)]
+
+            def scratch(name, dtype):
+                return np.lib.format.open_memmap(os.path.join(scratch_dir, f"{name}.npy"), mode="w+",
+                                                 dtype=dtype, shape=(n_rows,))
+
+            block_rows = self.chunksize
+            filtered = {name: scratch(f"filtered_{name}", dtype) for name, dtype in dtypes}
+            user_code = np.full(len(counts), -1, dtype=np.int64)
+            anime_code = np.full(0, -1, dtype=np.int64)
+            user_ids, anime_ids = [], []
+            offset = 0
+            for chunk in self._read_chunks(usecols):
+                users = chunk["user_id"].to_numpy(dtype=np.int64)
+                keep = keep_user[users]
+                users = users[keep]
+                animes = chunk["anime_id"].to_numpy(dtype=np.int64)[keep]
+                ratings = chunk["rating"].to_numpy()[keep]
+
+                # Encode ids in order of first appearance, like Series.unique()
+                new_users = pd.unique(users[user_code[users] < 0])
+                user_code[new_users] = np.arange(len(user_ids), len(user_ids) + len(new_users))
+                user_ids.extend(new_users.tolist())
+
+                anime_code = self._grow(anime_code, int(animes.max()) + 1 if len(animes) else 0, -1)
+                new_animes = pd.unique(animes[anime_code[animes] < 0])
+                anime_code[new_animes] = np.arange(len(anime_ids), len(anime_ids) + len(new_animes))
+                anime_ids.extend(new_animes.tolist())
+
+                rows = slice(offset, offset + len(users))
+                filtered["user_id"][rows] = users
+                filtered["anime_id"][rows] = animes
+                filtered["rating"][rows] = ((ratings - min_rating) / (max_rating - min_rating)).astype(np.float64)
+                filtered["user"][rows] = user_code[users]
+                filtered["anime"][rows] = anime_code[animes]
+                offset += len(users)
+
+            self.user_ids = np.asarray(user_ids, dtype=np.int64)
+            self.anime_ids = np.asarray(anime_ids, dtype=np.int64)
+            logger.info("Ratings scaled and user/anime encoding completed in chunked mode.")
+
+            # RandomState.permutation shuffles an arange in place, so shuffling one on disk gives the same order
+            permutation = scratch("permutation", np.int64)
+            for start in range(0, n_rows, block_rows):
+                permutation[start:start + block_rows] = np.arange(start, min(start + block_rows, n_rows))
+            np.random.RandomState(random_state).shuffle(permutation)
+
+            # Shuffled position j holds filtered row permutation[j]; gather a block at a time, reading in file order
+            columns = {name: scratch(name, dtype) for name, dtype in dtypes}
+            for start in range(0, n_rows, block_rows):
+                source = np.asarray(permutation[start:start + block_rows])
+                order = np.argsort(source)
+                for name, values in columns.items():
+                    block = np.empty(len(source), dtype=values.dtype)
+                    block[order] = filtered[name][source[order]]
+                    values[start:start + len(source)] = block
+            del filtered, permutation
+
+            # Shuffled rows split into train/test exactly like split_data
+            train_indices = n_rows - test_set_size
+            self.rating_df = None
+            self.save_encoders()
+            self.save_rating_table(columns, n_train=train_indices)
+
+            kept_ids = self.user_ids
+            rating_index = UserRatingIndex.build_on_disk(
+                self.rating_index_dir, kept_ids, counts[kept_ids],
+                ((columns["user"][start:start + block_rows], columns["anime_id"][start:start + block_rows],
+                  columns["anime"][start:start + block_rows], columns["rating"][start:start + block_rows])
+                 for start in range(0, n_rows, block_rows)))
+            self.save_liked_matrix(rating_index)
+            del rating_index
+
+            # Training rows by anime, counted in one pass and sorted in a second
+            train_blocks = [(start, min(start + block_rows, train_indices)) for start in range(0, train_indices, block_rows)]
+            anime_counts = np.zeros(len(self.anime_ids), dtype=np.int64)
+            for start, stop in train_blocks:
+                anime_counts += np.bincount(columns["anime"][start:stop], minlength=len(anime_counts))
+            AnimeRatingIndex.build_on_disk(
+                self.anime_index_dir, anime_counts,
+                ((columns["anime"][start:stop], columns["user"][start:stop], columns["rating"][start:stop])
+                 for start, stop in train_blocks))
+
+            if self.legacy_artifacts:
+                # Plain-ndarray views of the memory-mapped columns, never copies: joblib streams
+                # each one to its pickle in fixed-size buffers
+                user, anime, rating = (columns[name].view(np.ndarray) for name in ("user", "anime", "rating"))
+                self.X_train_array = [user[:train_indices], anime[:train_indices]]
+                self.X_test_array = [user[train_indices:], anime[train_indices:]]
+                self.y_train = pd.Series(rating[:train_indices], name="rating", copy=False)
+                self.y_test = pd.Series(rating[train_indices:], name="rating",
+                                        index=pd.RangeIndex(train_indices, n_rows), copy=False)
+                self.save_legacy_artifacts()
+                self.X_train_array = self.X_test_array = self.y_train = self.y_test = None
+                del user, anime, rating
+                self.save_rating_columns(columns)
+
+            del columns
+            for name in os.listdir(scratch_dir):
+                os.remove(os.path.join(scratch_dir, name))
+            os.rmdir(scratch_dir)
+            logger.info("Chunked data processing completed.")
+        except CustomException:
+            raise
+        except Exception as e:
+            raise CustomException("Error during chunked data processing.", sys)
+
+    def save_rating_columns(self, columns, block_rows=1000000):
+        """Writes rating_df.csv block by block from per-column arrays."""
+        path = os.path.join(self.output_dir, "rating_df.csv")
+        n_rows = len(columns["user"])
+        for start in range(0, max(n_rows, 1), block_rows):
+            block = pd.DataFrame({name: np.asarray(columns[name][start:start + block_rows])
+                                  for name in ["user_id", "anime_id", "rating", "user", "anime"]})
+            block.to_csv(path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+        logger.info(f"Rating DataFrame with {n_rows} rows saved to {path} in blocks.")
 
     def process_anime_data(self):
         """Processes the anime data as per the given steps."""
@@ -129,18 +382,11 @@ class DataProcessing:
             sypnopsis_df = pd.read_csv(os.path.join('artifacts', 'raw', 'anime_with_synopsis.csv'),usecols=cols)
             df = df.replace("Unknown", np.nan)
 
-            def getAnimeName(anime_id):
-                try:
-                    name = df[df.anime_id == anime_id].eng_version.values[0]
-                    if pd.isna(name):
-                        name = df[df.anime_id == anime_id].Name.values[0]
-                except:
-                    name = None
-                return name
-
+            # English name, falling back to the original Name, taken from the first row of each anime_id
             df['anime_id'] = df['MAL_ID']
-            df["eng_version"] = df['English name']
-            df['eng_version'] = df.anime_id.apply(lambda x: getAnimeName(x))
+            names = df['English name'].where(df['English name'].notna(), df['Name'])
+            first = ~df['anime_id'].duplicated()
+            df['eng_version'] = df['anime_id'].map(pd.Series(names[first].values, index=df['anime_id'][first]))
 
             df.sort_values(by=['Score'], inplace=True, ascending=False, kind='quicksort', na_position='last')
             df = df[["anime_id", "eng_version", "Score", "Genres", "Episodes", "Type", "Premiered", "Members"]]
@@ -152,16 +398,34 @@ class DataProcessing:
         except Exception as e:
             raise CustomException("Error during anime data processing.", sys)
 
+    def timed(self, stage, *args, **kwargs):
+        """Runs one pipeline stage and records its wall-clock time."""
+        start = time.perf_counter()
+        result = stage(*args, **kwargs)
+        self.stage_timings[stage.__name__] = time.perf_counter() - start
+        return result
+
+    def log_stage_timings(self):
+        total = sum(self.stage_timings.values())
+        for name, seconds in self.stage_timings.items():
+            logger.info(f"Stage {name}: {seconds:.3f}s ({100 * seconds / max(total, 1e-9):.1f}%)")
+        logger.info(f"Data processing stages took {total:.3f}s in total.")
+
     def process_data(self):
         """Executes the complete data processing pipeline."""
         try:
-            self.load_data(usecols=["user_id", "anime_id", "rating"])
-            self.filter_users()
-            self.scale_ratings()
-            self.encode_data()
-            self.split_data()
-            self.save_artifacts()
-            self.process_anime_data()  # Process the anime data
+            self.stage_timings = {}
+            if self.chunksize:
+                self.timed(self.process_data_chunked, usecols=["user_id", "anime_id", "rating"])
+            else:
+                self.timed(self.load_data, usecols=["user_id", "anime_id", "rating"])
+                self.timed(self.filter_users)
+                self.timed(self.scale_ratings)
+                self.timed(self.encode_data)
+                self.timed(self.split_data)
+                self.timed(self.save_artifacts)
+            self.timed(self.process_anime_data)  # Process the anime data
+            self.log_stage_timings()
             logger.info("Data processing pipeline completed successfully.")
         except CustomException as e:
             logger.error(str(e))
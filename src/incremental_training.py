@@ -0,0 +1,365 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import joblib
+from utils.common_functions import read_yaml
+from utils.columnar import (table_exists, read_table, read_schema, append_rows, replace_table, replace_rows,
+                            row_positions, dense_encoder)
+from utils.rating_index import UserRatingIndex, AnimeRatingIndex
+from src.custom_exception import CustomException
+from src.logger import get_logger
+from src.data_processing import RATING_COLUMNS
+from src.weights_export import WeightsExport
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+class IncrementalTraining:
+    """Folds newly arrived ratings into the processed data and warm-starts the embeddings.
+
+    New user and anime ids are appended to the encoders, so existing ids
+    keep their rows. The Keras engine grows the embedding tables of the
+    saved checkpoint and fine-tunes only on the new ratings, mixed with a
+    replayed sample of older ones so shared layers do not drift. The ALS
+    engine keeps the saved factors and re-solves only the users and animes
+    the new ratings touch, reading their ratings from the user and anime
+    rating indexes. The update is staged in memory and only written once
+    the new weights are exported, so a failed run leaves the processed data
+    matching the previous weights. Writing it appends the new rows to the
+    ratings table and rewrites only the index and liked-matrix rows of the
+    touched users and animes, so it costs in proportion to the change, not
+    to the history.
+    """
+
+    def __init__(self, config_path, input_file=NEW_RATINGS_CSV):
+        self.config = read_yaml(config_path)
+        self.config_path = config_path
+        self.input_file = input_file
+        self.incremental_config = self.config.get('incremental', {})
+        self.staged = None  # Update written by commit_data
+        logger.info(f"Incremental training initialized for {input_file}")
+
+    ############################ DATA ############################
+
+    @staticmethod
+    def _extend(decoder, ids):
+        """Appends unseen ids to `decoder` in order of first appearance and encodes `ids`."""
+        encoder = dense_encoder(decoder)
+        size = max(len(encoder), int(ids.max()) + 1 if len(ids) else 0)
+        encoder = np.concatenate([encoder, np.full(size - len(encoder), -1, dtype=encoder.dtype)])
+        new_ids = pd.unique(ids[encoder[ids] < 0])
+        encoder[new_ids] = np.arange(len(decoder), len(decoder) + len(new_ids))
+        return np.concatenate([decoder, new_ids]).astype(np.int64), encoder[ids].astype(np.int64)
+
+    def filter_new(self, new, user_decoder):
+        """Drops repeated (user, anime) pairs and new users with fewer than `min_ratings` ratings in `new`.
+
+        Users already encoded passed the filter when the data was processed
+        and keep every new rating. A new user is admitted once one file holds
+        enough of their ratings, like DataProcessing.filter_users.
+        """
+        min_ratings = self.incremental_config.get('min_ratings', 400)
+        new = new.drop_duplicates(subset=["user_id", "anime_id"])
+        n_ratings = new.groupby("user_id")["user_id"].transform("size")
+        keep = new["user_id"].isin(user_decoder) | (n_ratings >= min_ratings)
+        logger.info(f"Dropped {int((~keep).sum())} ratings of new users with fewer than {min_ratings} ratings")
+        return new[keep]
+
+    @staticmethod
+    def rated(user, anime, n_animes_old):
+        """Whether each encoded (user, anime) pair already has a rating in the processed data.
+
+        Only the index rows of the known users involved are read.
+        """
+        rating_index = UserRatingIndex.load(RATING_INDEX_DIR)
+        known = (user < rating_index.n_users) & (anime < n_animes_old)
+        rated_user, rated_anime, _ = rating_index.ratings(np.unique(user[known]))
+        return known & np.isin(user * n_animes_old + anime, rated_user * n_animes_old + rated_anime)
+
+    @staticmethod
+    def anime_index(block_rows=1048576):
+        """The training-split anime index, built once from the ratings table if the processed data predates it."""
+        if not table_exists(ANIME_RATING_INDEX_DIR):
+            logger.warning(f"No anime rating index in {ANIME_RATING_INDEX_DIR}, building it from the ratings table")
+            columns, meta = read_table(RATINGS_TABLE, columns=["user", "anime", "rating"])
+            blocks = [(start, min(start + block_rows, meta["n_train"])) for start in range(0, meta["n_train"], block_rows)]
+            counts = np.zeros(read_schema(ENCODERS_TABLE)["columns"]["anime_decoder"]["length"], dtype=np.int64)
+            for start, stop in blocks:
+                counts += np.bincount(columns["anime"][start:stop], minlength=len(counts))
+            AnimeRatingIndex.build_on_disk(ANIME_RATING_INDEX_DIR, counts,
+                                           ((columns["anime"][start:stop], columns["user"][start:stop],
+                                             columns["rating"][start:stop]) for start, stop in blocks))
+        return AnimeRatingIndex.load(ANIME_RATING_INDEX_DIR)
+
+    def update_data(self):
+        """Encodes the new ratings and stages them with the extended encoders.
+
+        Ratings for pairs already in the processed data are dropped, so
+        feeding the same file twice adds nothing. Returns the new rows as
+        (user, anime, rating) plus the table sizes before and after the
+        update; nothing is staged when no new rows remain.
+        """
+        try:
+            self.discard_data()
+            # Updates repoint index rows, which needs the start/stop layout DataProcessing writes
+            if not (table_exists(RATINGS_TABLE) and table_exists(ENCODERS_TABLE)
+                    and all(table_exists(path) and "starts" in read_schema(path)["columns"]
+                            for path in (RATING_INDEX_DIR, LIKED_TABLE))):
+                raise FileNotFoundError("Incremental training needs the columnar tables written by DataProcessing")
+
+            encoders, _ = read_table(ENCODERS_TABLE, columns=["user_decoder", "anime_decoder"], mmap_mode=None)
+            meta = read_schema(RATINGS_TABLE)["meta"]
+            new = pd.read_csv(self.input_file, usecols=["user_id", "anime_id", "rating"])
+            logger.info(f"Loaded {len(new)} new ratings from {self.input_file}")
+            new = self.filter_new(new, encoders["user_decoder"])
+
+            user_decoder, user = self._extend(encoders["user_decoder"], new["user_id"].to_numpy(dtype=np.int64))
+            anime_decoder, anime = self._extend(encoders["anime_decoder"], new["anime_id"].to_numpy(dtype=np.int64))
+            # Already rated pairs only involve known ids, so dropping them leaves the extended encoders exact
+            fresh = ~self.rated(user, anime, len(encoders["anime_decoder"]))
+            new, user, anime = new[fresh], user[fresh], anime[fresh]
+            logger.info(f"Dropped {int((~fresh).sum())} ratings already in the processed data")
+
+            rating_min, rating_max = meta.get("rating_min", 0.0), meta.get("rating_max", 10.0)
+            rating = np.clip((new["rating"].to_numpy(dtype=np.float64) - rating_min) / (rating_max - rating_min), 0, 1)
+            sizes = {"n_users_old": len(encoders["user_decoder"]), "n_animes_old": len(encoders["anime_decoder"]),
+                     "n_users": len(user_decoder), "n_animes": len(anime_decoder), "n_train_old": meta["n_train"]}
+            if len(new) == 0:
+                return (user, anime, rating.astype(np.float32)), sizes
+            logger.info(f"Encoders extended: {sizes}")
+
+            self.staged = {
+                "user_decoder": user_decoder,
+                "anime_decoder": anime_decoder,
+                "rows": {"user_id": new["user_id"].to_numpy(), "anime_id": new["anime_id"].to_numpy(),
+                         "rating": rating, "user": user, "anime": anime},
+                "sizes": sizes,
+            }
+            logger.info(f"{len(new)} new ratings staged")
+            return (user, anime, rating.astype(np.float32)), sizes
+        except Exception as e:
+            logger.error(f"Error while updating processed data: {str(e)}")
+            self.discard_data()
+            raise CustomException("Failed to update processed data", e)
+
+    @staticmethod
+    def extend_rows(directory, index, rows, added, key, row_data=None, **meta):
+        """Rewrites `rows` of an index table as their current entries followed by the `added` ones.
+
+        `added` holds the new entries' data columns plus `key`, the row of
+        each; each of `rows` gets at least one. Only those rows are read and
+        written.
+        """
+        known = rows[rows < len(index.starts)]
+        lengths, positions = row_positions(index.starts, index.stops, known)
+        keys = np.concatenate([np.repeat(known, lengths), added[key]])
+        order = np.argsort(keys, kind="stable")
+        data = {name: np.concatenate([np.asarray(getattr(index, name)[positions]),
+                                      np.asarray(added[name], dtype=dtype)])[order]
+                for name, dtype in index.DATA.items()}
+        replace_rows(directory, rows, np.unique(keys, return_counts=True)[1], data, row_data=row_data, **meta)
+
+    def commit_data(self):
+        """Writes the staged update into the processed data.
+
+        The new rows join the training split just before the test split,
+        which is short and the only part of the ratings table moved. The
+        touched users' histories and liked animes and the touched animes'
+        training ratings are rewritten as new rows of their index tables;
+        nothing else in them is read or written.
+        """
+        if self.staged is None:
+            return
+        try:
+            rows, sizes = self.staged["rows"], self.staged["sizes"]
+            user_rows, anime_rows = np.unique(rows["user"]), np.unique(rows["anime"])
+
+            self.extend_rows(ANIME_RATING_INDEX_DIR, self.anime_index(), anime_rows, rows, "anime")
+            self.extend_rows(RATING_INDEX_DIR, UserRatingIndex.load(RATING_INDEX_DIR), user_rows, rows, "user",
+                             row_data={"user_id": self.staged["user_decoder"][sizes["n_users_old"]:]})
+            indptr, liked = UserRatingIndex.load(RATING_INDEX_DIR).liked(user_rows)
+            replace_rows(LIKED_TABLE, user_rows, np.diff(indptr), {"anime": liked}, n_animes=sizes["n_animes"])
+
+            append_rows(RATINGS_TABLE, {name: rows[name] for name in RATING_COLUMNS}, at=sizes["n_train_old"],
+                        n_train=sizes["n_train_old"] + len(rows["user"]))
+            replace_table(ENCODERS_TABLE, {
+                "user_decoder": self.staged["user_decoder"],
+                "user_encoder": dense_encoder(self.staged["user_decoder"]),
+                "anime_decoder": self.staged["anime_decoder"],
+                "anime_encoder": dense_encoder(self.staged["anime_decoder"]),
+            }, dtypes={"user_decoder": np.int32, "anime_decoder": np.int32})
+            logger.info(f"{len(rows['user'])} new ratings written for {len(user_rows)} users and {len(anime_rows)} animes")
+            self.update_legacy_artifacts()
+            self.discard_data()
+        except Exception as e:
+            logger.error(f"Error while writing the processed data update: {str(e)}")
+            raise CustomException("Failed to write processed data update", e)
+
+    def update_legacy_artifacts(self):
+        """Keeps the legacy files DataProcessing may have written in step with the tables.
+
+        The id pickles are rewritten from the extended decoders and the new
+        rows appended to rating_df.csv, so both cost the size of the ids and
+        rows involved. The X/y split pickles could only be rewritten whole,
+        so they are removed instead; the trainers read the ratings table.
+        """
+        rows = self.staged["rows"]
+        if os.path.exists(RATING_DF):
+            header = pd.read_csv(RATING_DF, nrows=0).columns
+            pd.DataFrame({name: rows[name] for name in header}).to_csv(RATING_DF, mode="a", header=False, index=False)
+        for decoder, encoded_path, decoded_path in ((self.staged["user_decoder"], USER2USER_ENCODED, USER2USER_DECODED),
+                                                    (self.staged["anime_decoder"], ANIME2ANIME_ENCODED, ANIME2ANIME_DECODED)):
+            if os.path.exists(encoded_path) or os.path.exists(decoded_path):
+                ids = decoder.tolist()
+                joblib.dump(dict(zip(ids, range(len(ids)))), encoded_path)
+                joblib.dump(dict(enumerate(ids)), decoded_path)
+        stale = [path for path in (X_TRAIN_ARRAY, X_TEST_ARRAY, Y_TRAIN, Y_TEST) if os.path.exists(path)]
+        for path in stale:
+            os.remove(path)
+        if stale:
+            logger.warning(f"Removed the split pickles {stale}, which the ratings table now supersedes")
+
+    def discard_data(self):
+        self.staged = None
+
+    def replay_sample(self, n_rows, n_train_old):
+        """Random rows from the training split as it was before the update."""
+        columns, _ = read_table(RATINGS_TABLE, columns=["user", "anime", "rating"])
+        n_rows = min(n_rows, n_train_old)
+        rows = np.sort(np.random.default_rng().choice(n_train_old, n_rows, replace=False))
+        return tuple(np.asarray(columns[name][rows]) for name in ["user", "anime", "rating"])
+
+    ############################ KERAS ############################
+
+    def warm_start_model(self, sizes):
+        """RecommenderNet with grown tables, initialized from the saved checkpoint."""
+        from src.base_model import BaseModel  # Only the Keras engine needs TensorFlow
+
+        base_model = BaseModel(config_path=self.config_path)
+        previous = base_model.RecommenderNet(n_users=sizes["n_users_old"], n_animes=sizes["n_animes_old"])
+        previous.load_weights(CHECKPOINT_FILE_PATH)
+        model = base_model.RecommenderNet(n_users=sizes["n_users"], n_animes=sizes["n_animes"])
+        for old_layer, layer in zip(previous.layers, model.layers):
+            weights = old_layer.get_weights()
+            if layer.name in ("user_embedding", "anime_embedding"):
+                table = layer.get_weights()[0]  # Fresh initialization for the new rows
+                table[:len(weights[0])] = weights[0]
+                weights = [table]
+            layer.set_weights(weights)
+        model.optimizer.learning_rate = self.incremental_config.get('learning_rate', 0.00005)
+        return model
+
+    def fine_tune_keras(self, new_rows, sizes):
+        from utils.input_pipeline import make_dataset
+
+        model = self.warm_start_model(sizes)
+        replay = self.replay_sample(int(len(new_rows[0]) * self.incremental_config.get('replay_ratio', 1.0)),
+                                    sizes["n_train_old"])
+        user, anime, rating = (np.concatenate(pair) for pair in zip(new_rows, replay))
+        dataset = make_dataset(user, anime, rating, self.incremental_config.get('batch_size', 10000),
+                               shuffle_buffer=len(rating))
+        model.fit(dataset, epochs=self.incremental_config.get('epochs', 3), verbose=1)
+        return model
+
+    @staticmethod
+    def save_keras(model):
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        model.save_weights(CHECKPOINT_FILE_PATH)  # The next incremental run starts from here
+        model.save(MODEL_PATH)
+
+    ############################ ALS ############################
+
+    def touched_ratings(self, new_rows, user_rows, anime_rows, sizes):
+        """Training ratings of `user_rows` and of `anime_rows`, each as (user, anime, rating), new rows included.
+
+        Only the index rows of the touched users and animes are read. The
+        user index also holds the short test split, whose pairs are dropped.
+        """
+        rating_index = UserRatingIndex.load(RATING_INDEX_DIR)
+        user, anime, rating = rating_index.ratings(user_rows[user_rows < rating_index.n_users])
+        columns, _ = read_table(RATINGS_TABLE, columns=["user", "anime"])
+        test = (np.asarray(columns["user"][sizes["n_train_old"]:], dtype=np.int64) * sizes["n_animes"]
+                + np.asarray(columns["anime"][sizes["n_train_old"]:], dtype=np.int64))
+        train = ~np.isin(user * sizes["n_animes"] + anime, test)
+        user_side = tuple(np.concatenate([old[train], added]) for old, added in zip((user, anime, rating), new_rows))
+
+        anime_index = self.anime_index()
+        anime_side = tuple(np.concatenate(pair) for pair in
+                           zip(anime_index.ratings(anime_rows[anime_rows < anime_index.n_animes]), new_rows))
+        return user_side, anime_side
+
+    def fine_tune_als(self, new_rows, sizes):
+        """Raw (user_factors, anime_factors) after re-solving the users and animes in `new_rows`.
+
+        The saved factors of everyone else stay fixed. Without saved
+        factors matching the previous encoders, ALS is fitted from scratch
+        on the training split plus the new rows.
+        """
+        from src.als_training import ALSTraining
+
+        trainer = ALSTraining(config_path=self.config_path)
+        factors = np.load(ALS_CHECKPOINT_PATH) if os.path.exists(ALS_CHECKPOINT_PATH) else None
+        if factors is None or "rating_mean" not in factors.files \
+                or len(factors["user_factors"]) != sizes["n_users_old"] \
+                or len(factors["anime_factors"]) != sizes["n_animes_old"]:
+            logger.warning("No ALS factors matching the previous encoders, fitting from scratch")
+            columns, _ = read_table(RATINGS_TABLE, columns=["user", "anime", "rating"])
+            train = [np.concatenate([column[:sizes["n_train_old"]], added])
+                     for column, added in zip(columns.values(), new_rows)]
+            return trainer, trainer.fit(*train, sizes["n_users"], sizes["n_animes"])
+
+        trainer.rating_mean = float(factors["rating_mean"])
+        user_factors = np.concatenate([factors["user_factors"], trainer.init_factors(sizes["n_users"] - sizes["n_users_old"])])
+        anime_factors = np.concatenate([factors["anime_factors"],
+                                        trainer.init_factors(sizes["n_animes"] - sizes["n_animes_old"], seed=1)])
+        user_rows, anime_rows = np.unique(new_rows[0]), np.unique(new_rows[1])
+        user_ratings, anime_ratings = self.touched_ratings(new_rows, user_rows, anime_rows, sizes)
+        logger.info(f"Refitting {len(user_rows)} users on {len(user_ratings[2])} ratings "
+                    f"and {len(anime_rows)} animes on {len(anime_ratings[2])} ratings")
+        return trainer, trainer.refit_rows(user_ratings, anime_ratings, user_factors, anime_factors, user_rows, anime_rows,
+                                           iterations=self.incremental_config.get('als_iterations', 1))
+
+    @staticmethod
+    def normalize(weights):
+        return weights / np.linalg.norm(weights, axis=1).reshape((-1, 1))
+
+    def run(self):
+        """Stages the update, warm-starts the configured engine, exports the weights, then writes the update."""
+        try:
+            start = time.perf_counter()
+            new_rows, sizes = self.update_data()
+            if len(new_rows[0]) == 0:
+                logger.info("No new ratings, embeddings left unchanged")
+                return
+            try:
+                if self.config['model'].get('engine', 'keras') == 'als':
+                    trainer, (user_factors, anime_factors) = self.fine_tune_als(new_rows, sizes)
+                    user_weights, anime_weights = self.normalize(user_factors), self.normalize(anime_factors)
+                else:
+                    model = self.fine_tune_keras(new_rows, sizes)
+                    user_weights, anime_weights = (self.normalize(model.get_layer(name).get_weights()[0])
+                                                   for name in ("user_embedding", "anime_embedding"))
+                WeightsExport(self.config).export(user_weights, anime_weights)
+            except Exception:
+                logger.error("Fine-tuning failed, discarding the staged data")
+                self.discard_data()
+                raise
+
+            # The checkpoint the next run starts from is kept with the data it matches
+            if self.config['model'].get('engine', 'keras') == 'als':
+                trainer.save_factors(user_factors, anime_factors)
+            else:
+                self.save_keras(model)
+            self.commit_data()
+            logger.info(f"Incremental training with {len(new_rows[0])} new ratings completed in {time.perf_counter() - start:.2f}s")
+        except CustomException:
+            raise
+        except Exception as e:
+            logger.error(f"Error during incremental training: {str(e)}")
+            raise CustomException("Incremental training failed", e)
+
+
+if __name__ == "__main__":
+    incremental_trainer = IncrementalTraining(config_path=CONFIG_PATH)
+    incremental_trainer.run()
@@ -1,34 +1,53 @@
 import joblib
 import numpy as np
 import os
+import sys
+import tensorflow as tf
 from tensorflow.keras.callbacks import LearningRateScheduler, ModelCheckpoint, EarlyStopping
 from utils.common_functions import read_yaml
 from src.custom_exception import CustomException
 from src.logger import get_logger
-from src.base_model import BaseModel  # Importing BaseModel
+from src.base_model import BaseModel, PRECISIONS  # Importing BaseModel
+from src.weights_export import WeightsExport
+from utils.evaluation import ranking_auc
+from utils.columnar import table_exists, read_table, read_schema
+from utils.input_pipeline import make_dataset, measure_throughput
+from utils.metrics_logger import MetricsLogger
+from utils.training_metrics import TrainingMetrics
 from config.paths_config import *
-import comet_ml  # Import comet_ml for experiment tracking
 
 
 logger = get_logger(__name__)
 
+COMET_SETTINGS = dict(
+    api_key=os.environ.get("COMET_API_KEY", "uqgrnGhGvBA0zC3HfdmGf2WN9"),
+    project_name="mlops-2",
+    workspace="data-guru0" # Set your workspace name
+)
+
 class ModelTraining:
     def __init__(self, config_path, data_path):
         """Initialize with configuration and data path."""
         self.config = read_yaml(config_path)
         self.data_path = data_path
         
-        # Initialize Comet experiment for online mode
-        self.experiment = comet_ml.Experiment(
-            api_key="uqgrnGhGvBA0zC3HfdmGf2WN9",
-            project_name="mlops-2",
-            workspace="data-guru0" # Set your workspace name
-        )
-        logger.info("Comet experiment initialized in online mode.")
+        # Metrics go to the sinks in the tracking config from a background thread
+        self.experiment = MetricsLogger.from_config(self.config, comet_settings=COMET_SETTINGS)
+        logger.info("Metrics logger initialized.")
     
     def load_data(self):
-        """Load training and testing data from .pkl files."""
+        """Load training and testing data, memory-mapped from the columnar ratings table if present."""
         try:
+            if table_exists(RATINGS_TABLE):
+                columns, meta = read_table(RATINGS_TABLE, columns=["user", "anime", "rating"])
+                n_train = meta["n_train"]
+                user, anime, rating = columns["user"], columns["anime"], columns["rating"]
+                X_train_array = [user[:n_train], anime[:n_train]]
+                X_test_array = [user[n_train:], anime[n_train:]]
+                y_train, y_test = rating[:n_train], rating[n_train:]
+                logger.info(f"Successfully loaded data from {RATINGS_TABLE}")
+                return X_train_array, X_test_array, y_train, y_test
+
             X_train_array = joblib.load(X_TRAIN_ARRAY)
             X_test_array = joblib.load(X_TEST_ARRAY)
             y_train = joblib.load(Y_TRAIN)
@@ -40,12 +59,34 @@ class ModelTraining:
             logger.error("Error while loading data")
             raise CustomException("Failed to load data", e)
 
+    def load_vocabulary_sizes(self):
+        """Number of encoded users and animes, read from the encoder table's schema if present."""
+        if table_exists(ENCODERS_TABLE):
+            columns = read_schema(ENCODERS_TABLE)["columns"]
+            return columns["user_decoder"]["length"], columns["anime_decoder"]["length"]
+        return len(joblib.load(USER2USER_ENCODED)), len(joblib.load(ANIME2ANIME_ENCODED))
+
+    def make_datasets(self, X_train_array, X_test_array, y_train, y_test, batch_size):
+        """Streaming tf.data pipelines over the training and validation columns."""
+        pipeline_config = self.config.get('input_pipeline', {})
+        options = dict(block_rows=pipeline_config.get('block_rows', 65536),
+                       num_parallel_calls=pipeline_config.get('num_parallel_calls') or tf.data.AUTOTUNE)
+        train_dataset = make_dataset(X_train_array[0], X_train_array[1], np.asarray(y_train), batch_size,
+                                     shuffle_buffer=pipeline_config.get('shuffle_buffer'), **options)
+        test_dataset = make_dataset(X_test_array[0], X_test_array[1], np.asarray(y_test), batch_size, **options)
+
+        n_batches = pipeline_config.get('throughput_batches', 50)
+        if n_batches:
+            throughput = measure_throughput(train_dataset, n_batches)
+            logger.info(f"Input pipeline throughput: {throughput:,.0f} samples/s")
+            self.experiment.log_metric('input_samples_per_second', throughput)
+        return train_dataset, test_dataset
+
     def train_model(self):
         """Main method to train the model."""
         X_train_array, X_test_array, y_train, y_test = self.load_data()
 
-        n_users = len(joblib.load(USER2USER_ENCODED))  # Loaded from processed data
-        n_animes = len(joblib.load(ANIME2ANIME_ENCODED))  # Loaded from processed data
+        n_users, n_animes = self.load_vocabulary_sizes()
 
         # Initialize model using BaseModel
         base_model = BaseModel(config_path=CONFIG_PATH)
@@ -56,7 +97,7 @@ class ModelTraining:
         start_lr = 0.00001
         min_lr = 0.00001
         max_lr = 0.00005
-        batch_size = 10000
+        batch_size = self.config.get('input_pipeline', {}).get('batch_size', 10000)
         rampup_epochs = 5
         sustain_epochs = 0
         exp_decay = .8
@@ -89,14 +130,14 @@ class ModelTraining:
 
         # Model training
         try:
+            train_dataset, test_dataset = self.make_datasets(X_train_array, X_test_array, y_train, y_test, batch_size)
             history = model.fit(
-                x=X_train_array,
-                y=y_train,
-                batch_size=batch_size,
+                train_dataset,
                 epochs=20,
                 verbose=1,
-                validation_data=(X_test_array, y_test),
-                callbacks=[model_checkpoints, lr_callback, early_stopping]
+                validation_data=test_dataset,
+                callbacks=[model_checkpoints, lr_callback, early_stopping,
+                           TrainingMetrics(self.experiment, batch_size, samples_per_epoch=len(y_train))]
             )
 
             model.load_weights(CHECKPOINT_FILE_PATH)
@@ -122,7 +163,47 @@ class ModelTraining:
             logger.error(f"Error during model training: {str(e)}")
             raise CustomException("Model training failed", e)
 
-        self.save_model_and_weights(model)
+        user_weights, anime_weights = self.save_model_and_weights(model)
+
+        auc = ranking_auc(user_weights, anime_weights, X_test_array[0], X_test_array[1], y_test)
+        logger.info(f"Held-out ranking AUC: {auc:.4f}")
+        self.experiment.log_metric('ranking_auc', auc)
+        self.experiment.close()
+
+    def benchmark_modes(self, modes=None, epochs=3):
+        """Epoch time and final validation loss of each (precision, jit_compile) mode on the same data."""
+        try:
+            modes = modes or [(precision, jit_compile) for precision in PRECISIONS for jit_compile in (False, True)]
+            X_train_array, X_test_array, y_train, y_test = self.load_data()
+            n_users, n_animes = self.load_vocabulary_sizes()
+            batch_size = self.config.get('input_pipeline', {}).get('batch_size', 10000)
+
+            # Cached, unshuffled batches so the comparison times the model rather than the input pipeline
+            train_dataset = make_dataset(X_train_array[0], X_train_array[1], np.asarray(y_train), batch_size).cache()
+            test_dataset = make_dataset(X_test_array[0], X_test_array[1], np.asarray(y_test), batch_size).cache()
+
+            base_model = BaseModel(config_path=CONFIG_PATH)
+            results = {}
+            for precision, jit_compile in modes:
+                tf.keras.utils.set_random_seed(0)
+                base_model.config['model'].update(precision=precision, jit_compile=jit_compile)
+                model = base_model.RecommenderNet(n_users=n_users, n_animes=n_animes)
+                timing = TrainingMetrics(self.experiment, batch_size, samples_per_epoch=len(y_train))
+                history = model.fit(train_dataset, epochs=epochs, verbose=0, validation_data=test_dataset, callbacks=[timing])
+
+                # The first epoch includes tracing and compilation
+                steady = [epoch['epoch_seconds'] for epoch in timing.history[1:]] or [timing.history[0]['epoch_seconds']]
+                name = f"{precision}_jit" if jit_compile else precision
+                results[name] = {"first_epoch_seconds": timing.history[0]['epoch_seconds'],
+                                 "epoch_seconds": float(np.mean(steady)),
+                                 "val_loss": float(history.history['val_loss'][-1])}
+                logger.info(f"Training mode {name}: {results[name]}")
+                self.experiment.log_metrics({f"{name}_{metric}": value for metric, value in results[name].items()})
+            self.experiment.close()
+            return results
+        except Exception as e:
+            logger.error(f"Error during training mode benchmark: {str(e)}")
+            raise CustomException("Training mode benchmark failed", e)
 
     def save_model_and_weights(self, model):
         """Save model and extract weights."""
@@ -135,16 +216,14 @@ class ModelTraining:
             user_weights = self.extract_weights('user_embedding', model)
             anime_weights = self.extract_weights('anime_embedding', model)
 
-            # Save weights using joblib
-            joblib.dump(user_weights, WEIGHTS_PATH_USER)
-            joblib.dump(anime_weights, WEIGHTS_PATH_ANIME)
-
-            logger.info("User and anime weights saved successfully")
+            # Save the weights and their serving formats
+            WeightsExport(self.config, self.experiment).export(user_weights, anime_weights)
 
             # Log model saving event to Comet
             self.experiment.log_asset(MODEL_PATH)
             self.experiment.log_asset(WEIGHTS_PATH_USER)
             self.experiment.log_asset(WEIGHTS_PATH_ANIME)
+            return user_weights, anime_weights
 
         except Exception as e:
             logger.error(f"Error saving model or weights: {str(e)}")
@@ -165,4 +244,7 @@ class ModelTraining:
 # Example usage
 if __name__ == "__main__":
     model_trainer = ModelTraining(config_path=CONFIG_PATH, data_path=PROCESSED_DIR)
-    model_trainer.train_model()
+    if sys.argv[1:] == ["benchmark"]:
+        model_trainer.benchmark_modes()
+    else:
+        model_trainer.train_model()
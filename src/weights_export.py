@@ -0,0 +1,88 @@
+import os
+import joblib
+import numpy as np
+from src.custom_exception import CustomException
+from src.logger import get_logger
+from utils.ann_index import IVFIndex
+from utils.embeddings import save_embeddings, quantization_report
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+class WeightsExport:
+    """Writes normalized user/anime embedding tables in every format the serving path reads.
+
+    Shared by the training engines so each only has to produce the two
+    tables. `experiment` is optional; when given, recall checks are logged
+    to it.
+    """
+
+    def __init__(self, config, experiment=None):
+        self.config = config
+        self.experiment = experiment
+
+    def log_metric(self, name, value):
+        if self.experiment is not None:
+            self.experiment.log_metric(name, value)
+
+    def export(self, user_weights, anime_weights):
+        """Save the pickled weights, their serving copies and the optional ANN indexes."""
+        try:
+            os.makedirs(WEIGHTS_DIR, exist_ok=True)
+
+            # Save weights using joblib
+            joblib.dump(user_weights, WEIGHTS_PATH_USER)
+            joblib.dump(anime_weights, WEIGHTS_PATH_ANIME)
+
+            logger.info("User and anime weights saved successfully")
+
+            # Save the memory-mappable (optionally quantized) copies used for serving
+            self.save_embeddings(user_weights, USER_EMBEDDINGS)
+            self.save_embeddings(anime_weights, ANIME_EMBEDDINGS)
+
+            # Build the optional ANN indexes next to the weights
+            self.build_ann_index(user_weights, ANN_INDEX_USER)
+            self.build_ann_index(anime_weights, ANN_INDEX_ANIME)
+        except CustomException:
+            raise
+        except Exception as e:
+            logger.error(f"Error exporting weights: {str(e)}")
+            raise CustomException("Error exporting weights", e)
+
+    def save_embeddings(self, weights, path):
+        """Save embeddings in the serving format and log top-k accuracy of every quantization."""
+        try:
+            embedding_config = self.config.get('embeddings', {})
+            save_embeddings(weights, path, dtype=embedding_config.get('dtype', 'float32'))
+
+            name = os.path.basename(path).split('.')[0]
+            report = quantization_report(weights, k=embedding_config.get('report_k', 10))
+            for dtype, metrics in report.items():
+                logger.info(f"Quantization report for {name} as {dtype}: {metrics}")
+                self.log_metric(f"{name}_{dtype}_recall", metrics['recall'])
+        except Exception as e:
+            logger.error(f"Error saving embeddings to {path}: {str(e)}")
+            raise CustomException(f"Error saving embeddings to {path}", e)
+
+    def build_ann_index(self, weights, index_path):
+        """Build, recall-check and save an IVF index for a normalized embedding table."""
+        try:
+            ann_config = self.config.get('ann', {})
+            if not ann_config.get('enabled', False) or len(weights) < ann_config.get('min_items', 0):
+                if os.path.exists(index_path):
+                    os.remove(index_path)  # Never serve an index built for older weights
+                logger.info(f"ANN index skipped for {index_path}, exact search will be used")
+                return None
+
+            index = IVFIndex.build(weights, n_lists=ann_config.get('n_lists'), n_probe=ann_config.get('n_probe', 8))
+
+            sample = np.random.default_rng(0).choice(len(weights), min(len(weights), ann_config.get('recall_sample', 1000)), replace=False)
+            report = index.recall(sample, k=ann_config.get('recall_k', 10))
+            logger.info(f"ANN recall check for {index_path}: {report}")
+            self.log_metric(f"{os.path.basename(index_path).split('.')[0]}_recall", report['recall'])
+
+            index.save(index_path)
+            return index
+        except Exception as e:
+            logger.error(f"Error building ANN index {index_path}: {str(e)}")
+            raise CustomException(f"Error building ANN index {index_path}", e)
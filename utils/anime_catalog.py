@@ -0,0 +1,122 @@
+import numbers
+import numpy as np
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+MISSING = -1
+
+
+def _first_positions(keys):
+    """Maps each key to the position of its first occurrence, skipping NaN."""
+    positions = {}
+    for i, key in enumerate(keys):
+        if isinstance(key, float) and np.isnan(key):
+            continue
+        positions.setdefault(key, i)
+    return positions
+
+
+def _direct_address(ids):
+    """Builds an id -> row table so integer lookups are a single array gather."""
+    ids = np.asarray(ids, dtype=np.int64)
+    table = np.full(int(ids.max()) + 1 if len(ids) else 1, MISSING, dtype=np.int64)
+    # Assign in reverse so the first occurrence of a duplicated id wins
+    rows = np.arange(len(ids), dtype=np.int64)
+    table[ids[::-1]] = rows[::-1]
+    return table
+
+
+class AnimeCatalog:
+    """Columnar, hash-indexed view of anime_df and synopsis_df.
+
+    Rows are kept in the order of the processed CSVs, so the first match
+    of a key is the same row the old boolean-mask scans returned.
+    """
+
+    def __init__(self, anime_df, synopsis_df):
+        self.anime_df = anime_df
+        self.anime_id = anime_df["anime_id"].to_numpy(dtype=np.int64)
+        self.eng_version = anime_df["eng_version"].to_numpy(dtype=object)
+        self.genres = anime_df["Genres"].to_numpy(dtype=object)
+
+        self.synopsis_id = synopsis_df["MAL_ID"].to_numpy(dtype=np.int64)
+        self.synopsis_name = synopsis_df["Name"].to_numpy(dtype=object)
+        self.synopsis = synopsis_df["sypnopsis"].to_numpy(dtype=object)
+
+        self._row_by_id = _direct_address(self.anime_id)
+        self._row_by_name = _first_positions(self.eng_version)
+        self._synopsis_by_id = _direct_address(self.synopsis_id)
+        self._synopsis_by_name = _first_positions(self.synopsis_name)
+
+        logger.info(f"Anime catalog built with {len(self.anime_id)} animes and {len(self.synopsis_id)} synopses")
+
+    @staticmethod
+    def _gather(table, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.full(ids.shape, MISSING, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < len(table))
+        rows[in_range] = table[ids[in_range]]
+        return rows
+
+    @staticmethod
+    def _strict(rows, keys, what):
+        if (rows == MISSING).any():
+            missing = [key for key, row in zip(keys, rows) if row == MISSING]
+            raise KeyError(f"{what} not found: {missing}")
+        return rows
+
+    ######################## BATCH API ########################
+
+    def rows_by_id(self, anime_ids, strict=False):
+        """Row positions in anime_df for many anime ids (MISSING when absent)."""
+        rows = self._gather(self._row_by_id, anime_ids)
+        return self._strict(rows, anime_ids, "anime_id") if strict else rows
+
+    def rows_by_name(self, names, strict=False):
+        """Row positions in anime_df for many eng_version names."""
+        rows = np.fromiter((self._row_by_name.get(name, MISSING) for name in names),
+                           dtype=np.int64, count=len(names))
+        return self._strict(rows, names, "eng_version") if strict else rows
+
+    def synopsis_rows_by_id(self, anime_ids, strict=False):
+        """Row positions in synopsis_df for many MAL ids."""
+        rows = self._gather(self._synopsis_by_id, anime_ids)
+        return self._strict(rows, anime_ids, "MAL_ID") if strict else rows
+
+    def synopses(self, anime_ids, strict=False):
+        """Synopsis text for many MAL ids (None when absent)."""
+        rows = self.synopsis_rows_by_id(anime_ids, strict=strict)
+        out = np.full(rows.shape, None, dtype=object)
+        found = rows != MISSING
+        out[found] = self.synopsis[rows[found]]
+        return out
+
+    ######################## SCALAR API ########################
+
+    def row(self, anime):
+        """Row position for an anime id (int) or eng_version name (str)."""
+        if isinstance(anime, numbers.Integral):
+            return int(self.rows_by_id([anime])[0])
+        if isinstance(anime, str):
+            return self._row_by_name.get(anime, MISSING)
+        return MISSING
+
+    def frame(self, anime):
+        """Single-row anime_df slice for `anime`, empty if it is unknown."""
+        if not isinstance(anime, (numbers.Integral, str)):
+            return None
+        row = self.row(anime)
+        return self.anime_df.iloc[[row] if row != MISSING else []]
+
+    def synopsis_of(self, anime):
+        """Synopsis for a MAL id (int) or synopsis Name (str)."""
+        if isinstance(anime, numbers.Integral):
+            row = int(self.synopsis_rows_by_id([anime])[0])
+        elif isinstance(anime, str):
+            row = self._synopsis_by_name.get(anime, MISSING)
+        else:
+            return None
+        if row == MISSING:
+            raise KeyError(f"No synopsis found for {anime}")
+        return self.synopsis[row]
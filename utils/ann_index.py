@@ -0,0 +1,194 @@
+import time
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.similarity import SimilarityEngine
+from utils.embeddings import as_embedding_table
+
+logger = get_logger(__name__)
+
+
+def _spherical_kmeans(weights, n_lists, n_iter=10, sample_size=100000, block_size=65536, seed=42):
+    """Clusters unit vectors by cosine similarity and returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    sample = weights
+    if len(weights) > sample_size:
+        sample = weights[rng.choice(len(weights), sample_size, replace=False)]
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].astype(np.float32)
+    for _ in range(n_iter):
+        assign = _assign(sample, centroids, block_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=n_lists)
+
+        # Re-seed empty lists from random points so every list stays usable
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids
+
+
+def _assign(weights, centroids, block_size=65536):
+    assign = np.empty(len(weights), dtype=np.int64)
+    for start in range(0, len(weights), block_size):
+        assign[start:start + block_size] = np.argmax(weights[start:start + block_size] @ centroids.T, axis=1)
+    return assign
+
+
+class IVFIndex:
+    """Inverted-file ANN index over an L2-normalized embedding table.
+
+    Items are bucketed by their nearest centroid. A query only scores the
+    items in its `n_probe` closest buckets, so `n_probe` trades recall for
+    latency: `n_probe == n_lists` is exact search.
+    """
+
+    def __init__(self, weights, centroids, offsets, items, n_probe=8):
+        self.weights = as_embedding_table(weights)
+        self.centroids = centroids
+        self.offsets = offsets
+        self.items = items
+        self.n_probe = n_probe
+        self.exact = SimilarityEngine(self.weights)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def n_items(self):
+        return self.weights.shape[0]
+
+    @classmethod
+    def build(cls, weights, n_lists=None, n_probe=8, n_iter=10):
+        """Trains the coarse quantizer and buckets every row of `weights`."""
+        try:
+            weights = as_embedding_table(weights).rows(slice(None))
+            n_lists = n_lists or max(1, int(np.sqrt(len(weights))))
+            n_lists = min(n_lists, len(weights))
+
+            start = time.perf_counter()
+            centroids = _spherical_kmeans(weights, n_lists, n_iter=n_iter)
+            assign = _assign(weights, centroids)
+
+            items = np.argsort(assign, kind="stable").astype(np.int64)
+            offsets = np.zeros(n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+
+            logger.info(f"IVF index built over {len(weights)} rows with {n_lists} lists in {time.perf_counter() - start:.2f}s")
+            return cls(weights, centroids, offsets, items, n_probe=n_probe)
+        except Exception as e:
+            logger.error(f"Error while building IVF index: {str(e)}")
+            raise CustomException("Failed to build IVF index", e)
+
+    def save(self, path):
+        """Persists the quantizer and inverted lists; the weights stay in their own file."""
+        try:
+            with open(path, "wb") as f:
+                np.savez(f, centroids=self.centroids, offsets=self.offsets,
+                         items=self.items, n_probe=np.int64(self.n_probe))
+            logger.info(f"IVF index saved to {path}")
+        except Exception as e:
+            logger.error(f"Error while saving IVF index to {path}: {str(e)}")
+            raise CustomException("Failed to save IVF index", e)
+
+    @classmethod
+    def load(cls, path, weights, n_probe=None):
+        """Loads an index saved with `save` on top of its embedding table."""
+        try:
+            data = np.load(path)
+            n_probe = n_probe or int(data["n_probe"])
+            logger.info(f"IVF index loaded from {path} with n_probe={n_probe}")
+            return cls(weights, data["centroids"], data["offsets"], data["items"], n_probe=n_probe)
+        except Exception as e:
+            logger.error(f"Error while loading IVF index from {path}: {str(e)}")
+            raise CustomException("Failed to load IVF index", e)
+
+    def scores(self, rows):
+        return self.exact.scores(rows)
+
+    def top_k(self, rows, k, neg=False, exclude_self=False, n_probe=None):
+        """Approximate (ids, scores) of the k nearest items, most similar first.
+
+        The whole batch is scored list by list (see `_probe`). Farthest-
+        neighbour queries (`neg`) and queries whose probed lists hold fewer
+        than k candidates are answered by exact search.
+        """
+        if neg:
+            return self.exact.top_k(rows, k, neg=neg, exclude_self=exclude_self)
+
+        rows = np.asarray(rows, dtype=np.int64)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        k = max(0, min(k, self.n_items - int(exclude_self)))
+        ids = np.empty((len(rows), k), dtype=np.int64)
+        scores = np.empty((len(rows), k), dtype=self.weights.dtype)
+        if k == 0 or len(rows) == 0:
+            return ids, scores
+
+        queries = self.weights.rows(rows)
+        probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        padded, padded_ids, counts = self._probe(queries, probes, k)
+        if exclude_self:
+            is_self = padded_ids == rows[:, None]
+            padded[is_self] = -np.inf
+            counts -= is_self.sum(axis=1)
+
+        best = np.argpartition(-padded, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(best, np.argsort(-np.take_along_axis(padded, best, axis=1), axis=1, kind="stable"), axis=1)
+        ids[:] = np.take_along_axis(padded_ids, best, axis=1)
+        scores[:] = np.take_along_axis(padded, best, axis=1)
+
+        # Queries whose probed lists hold fewer than k candidates fall back to exact search
+        short = np.flatnonzero(counts < k)
+        if len(short):
+            ids[short], scores[short] = self.exact.top_k(rows[short], k, exclude_self=exclude_self)
+        return ids, scores
+
+    def _probe(self, queries, probes, k):
+        """Similarities of every query to the items of its probed lists, one GEMM per probed list.
+
+        Each list's embeddings are read once and scored against all the
+        queries probing it. Returns (scores, ids) padded with -inf / -1 to a
+        common width, plus each query's candidate count.
+        """
+        sizes = np.diff(self.offsets)[probes]
+        slot_starts = np.cumsum(sizes, axis=1) - sizes  # Where each probed list starts in a query's row
+        counts = sizes.sum(axis=1)
+        width = max(int(counts.max()), k)
+        padded = np.full((len(queries), width), -np.inf, dtype=np.float32)
+        padded_ids = np.full((len(queries), width), -1, dtype=np.int64)
+
+        lists = probes.ravel()
+        order = np.argsort(lists, kind="stable")
+        probed, starts = np.unique(lists[order], return_index=True)
+        for lst, entries in zip(probed, np.split(order, starts[1:])):
+            members = self.items[self.offsets[lst]:self.offsets[lst + 1]]
+            if len(members) == 0:
+                continue
+            group = entries // probes.shape[1]
+            columns = slot_starts.ravel()[entries][:, None] + np.arange(len(members))
+            padded[group[:, None], columns] = queries[group] @ self.weights.rows(members).T
+            padded_ids[group[:, None], columns] = members
+        return padded, padded_ids, counts
+
+    def recall(self, rows, k=10, n_probe=None):
+        """Compares against exact search; returns recall@k and both latencies in seconds."""
+        start = time.perf_counter()
+        exact_ids, _ = self.exact.top_k(rows, k, exclude_self=True)
+        exact_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx_ids, _ = self.top_k(rows, k, exclude_self=True, n_probe=n_probe)
+        approx_time = time.perf_counter() - start
+
+        hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx_ids, exact_ids))
+        return {
+            "recall": hits / max(1, exact_ids.size),
+            "n_probe": min(n_probe or self.n_probe, self.n_lists),
+            "exact_seconds": exact_time,
+            "approx_seconds": approx_time,
+        }
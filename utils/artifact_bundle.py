@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"  # Holds the version the server should run
+
+# Directories snapshotted into a bundle, minus the training-only files
+BUNDLE_DIRS = (PROCESSED_DIR, WEIGHTS_DIR)
+TRAINING_ONLY = tuple(os.path.normpath(path) for path in (X_TRAIN_ARRAY, X_TEST_ARRAY, Y_TRAIN, Y_TEST, RATINGS_TABLE,
+                                                          ANIME_RATING_INDEX_DIR))
+
+# Legacy files the store only reads when the artifact replacing them is missing
+LEGACY_FALLBACKS = {
+    os.path.normpath(USER2USER_ENCODED): ENCODERS_TABLE,
+    os.path.normpath(USER2USER_DECODED): ENCODERS_TABLE,
+    os.path.normpath(ANIME2ANIME_ENCODED): ENCODERS_TABLE,
+    os.path.normpath(ANIME2ANIME_DECODED): ENCODERS_TABLE,
+    os.path.normpath(RATING_DF): RATING_INDEX_DIR,
+}
+
+
+def _sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _serving_files(directories=BUNDLE_DIRS):
+    """Every serving file under `directories`, as paths relative to ARTIFACTS_DIR."""
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(name for name in dirs if os.path.normpath(os.path.join(root, name)) not in TRAINING_ONLY)
+            for file_name in sorted(files):
+                path = os.path.normpath(os.path.join(root, file_name))
+                if path in TRAINING_ONLY or file_name.startswith("."):
+                    continue
+                if path in LEGACY_FALLBACKS and os.path.exists(LEGACY_FALLBACKS[path]):
+                    continue  # Superseded; the store only reads it when the replacement is missing
+                yield os.path.relpath(path, ARTIFACTS_DIR)
+
+
+def _content_digest(files):
+    return hashlib.sha1(json.dumps(files, sort_keys=True).encode()).hexdigest()
+
+
+def publish_bundle(directories=BUNDLE_DIRS, bundles_dir=BUNDLES_DIR, keep=3):
+    """Snapshots the serving artifacts into a new versioned bundle and makes it the current one.
+
+    Nothing is published when the files match the current bundle, which
+    then stays current. Files unchanged since the current bundle are
+    hard-linked rather than copied. The bundle is assembled under a
+    temporary name, its manifest written last, then renamed into place;
+    the CURRENT pointer is replaced atomically afterwards, so a reader
+    never sees a partial bundle. Returns the current version.
+    """
+    try:
+        os.makedirs(bundles_dir, exist_ok=True)
+        files = {}
+        for relative in _serving_files(directories):
+            source = os.path.join(ARTIFACTS_DIR, relative)
+            files[relative] = {"size": os.path.getsize(source), "sha256": _sha256(source)}
+        content = _content_digest(files)
+
+        current = current_bundle(bundles_dir)
+        previous = read_manifest(current[1])["files"] if current else {}
+        if current and _content_digest(previous) == content:
+            logger.info(f"Serving artifacts unchanged since bundle {current[0]}, nothing published")
+            return current[0]
+
+        staging = os.path.join(bundles_dir, f".staging-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        linked = 0
+        for relative, entry in files.items():
+            target = os.path.join(staging, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if previous.get(relative) == entry:
+                try:
+                    os.link(os.path.join(current[1], relative), target)
+                    linked += 1
+                    continue
+                except OSError:
+                    pass  # e.g. a file system without hard links
+            shutil.copy2(os.path.join(ARTIFACTS_DIR, relative), target)
+            if os.path.getsize(target) != entry["size"]:
+                raise ValueError(f"{relative} changed while it was being published")
+
+        created_at = time.time()
+        version = time.strftime("%Y%m%dT%H%M%S", time.gmtime(created_at)) + f"-{content[:8]}"
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as file:
+            json.dump({"version": version, "created_at": created_at, "files": files}, file, indent=1)
+
+        os.rename(staging, os.path.join(bundles_dir, version))
+        pointer = os.path.join(bundles_dir, CURRENT_FILE)
+        with open(pointer + ".tmp", "w") as file:
+            file.write(version)
+        os.replace(pointer + ".tmp", pointer)
+        logger.info(f"Published artifact bundle {version} with {len(files)} files ({linked} unchanged, hard-linked)")
+
+        prune_bundles(bundles_dir, keep=keep)
+        return version
+    except Exception as e:
+        logger.error(f"Error while publishing an artifact bundle: {str(e)}")
+        raise CustomException("Failed to publish artifact bundle", e)
+
+
+def read_manifest(bundle_path):
+    with open(os.path.join(bundle_path, MANIFEST_FILE)) as file:
+        return json.load(file)
+
+
+def current_bundle(bundles_dir=BUNDLES_DIR):
+    """(version, path) of the bundle CURRENT points to, or None when no bundle was published."""
+    try:
+        with open(os.path.join(bundles_dir, CURRENT_FILE)) as file:
+            version = file.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(bundles_dir, version)
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        logger.warning(f"Current bundle {version} has no manifest, ignoring it")
+        return None
+    return version, path
+
+
+def verify_bundle(bundle_path, checksums=False):
+    """Checks every file listed in the manifest is present with its recorded size (and hash)."""
+    manifest = read_manifest(bundle_path)
+    for relative, entry in manifest["files"].items():
+        path = os.path.join(bundle_path, relative)
+        if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            raise ValueError(f"Bundle {manifest['version']} is missing or has a truncated {relative}")
+        if checksums and _sha256(path) != entry["sha256"]:
+            raise ValueError(f"Bundle {manifest['version']} has a corrupted {relative}")
+    return manifest
+
+
+def prune_bundles(bundles_dir=BUNDLES_DIR, keep=3):
+    """Deletes all but the `keep` newest bundles, never the current one."""
+    current = current_bundle(bundles_dir)
+    versions = sorted(name for name in os.listdir(bundles_dir)
+                      if os.path.exists(os.path.join(bundles_dir, name, MANIFEST_FILE)))
+    for version in versions[:max(0, len(versions) - keep)]:
+        if current is None or version != current[0]:
+            shutil.rmtree(os.path.join(bundles_dir, version), ignore_errors=True)
+            logger.info(f"Removed old artifact bundle {version}")
+
+
+if __name__ == "__main__":
+    publish_bundle()
@@ -0,0 +1,111 @@
+import numpy as np
+from config.paths_config import *
+from utils.recommender_store import get_store
+from utils.anime_catalog import MISSING
+
+########################## SEGMENTED ARRAY OPS #################################
+
+
+def segment_top_n(segment, item, score, n):
+    """Keeps the n best (item, score) pairs of every segment.
+
+    Pairs come back grouped by segment, best score first, ties broken by
+    the smaller item index.
+    """
+    order = np.lexsort((item, -score, segment))
+    segment, item, score = segment[order], item[order], score[order]
+    if len(segment) == 0:
+        return segment, item, score
+    starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+    rank = np.arange(len(segment)) - np.repeat(starts, np.diff(np.r_[starts, len(segment)]))
+    keep = rank < n
+    return segment[keep], item[keep], score[keep]
+
+
+def scale_by_segment(segment, score):
+    """Divides every score by the largest score of its segment, so each segment's best is 1."""
+    if len(segment) == 0:
+        return score
+    best = np.zeros(int(segment.max()) + 1)
+    np.maximum.at(best, segment, score)
+    return np.divide(score, best[segment], out=np.zeros(len(score)), where=best[segment] > 0)
+
+
+##################################### USER-BASED ##########################################
+
+
+def encode_users(user_ids, path_user_encoded=USER2USER_ENCODED):
+    """Encoded rows of raw user ids, MISSING for unknown users."""
+    user2user_encoded = get_store().get(path_user_encoded)
+    return np.array([user2user_encoded.get(int(user_id), MISSING) for user_id in user_ids], dtype=np.int64)
+
+
+def find_similar_users_batch(user_rows, path_user_weights=USER_WEIGHTS, n=5):
+    """(rows, scores) of the n most similar users for each encoded user, in one GEMM."""
+    return get_store().similarity(path_user_weights).top_k(user_rows, n, exclude_self=True)
+
+
+def get_top_recommended_animes_batch(user_rows, similar_rows, path_rating_df=RATING_DF, n=10, similar_scores=None):
+    """Neighbour votes for every query user at once.
+
+    An anime gets one vote per similar user who liked it (rated it in their
+    top quartile) and is dropped if the query user liked it too. With
+    `similar_scores` each vote is worth the voter's (non-negative) similarity
+    instead of 1. Returns (query position, encoded anime, votes) with the n
+    most voted per query.
+    """
+    weights = None if similar_scores is None else np.maximum(similar_scores, 0)
+    query, anime, votes = get_store().liked_matrix(path_rating_df).votes(user_rows, similar_rows, weights)
+    return segment_top_n(query, anime, votes, n)
+
+
+#################################### CONTENT-BASED ########################################
+
+
+def similar_anime_rows(anime_rows, path_anime_weights=ANIME_WEIGHTS, n=5):
+    """(rows, scores) of the n most similar animes for each encoded anime."""
+    store = get_store()
+    neighbours = store.anime_neighbours(path_anime_weights)
+    if neighbours is not None and n <= neighbours.width:
+        return neighbours.top_k(anime_rows, n)
+    return store.similarity(path_anime_weights).top_k(anime_rows, n, exclude_self=True)
+
+
+###################################### FUSION #############################################
+
+
+def fuse_candidates(candidates, weights, n_items):
+    """Merges (segment, item, score) candidate arrays from several sources into one weighted score.
+
+    Duplicate pairs within a source are summed, then each source is scaled
+    so the best candidate of every segment scores 1 before the weighted sum.
+    Returns (segment, item, fused score, per-source scores) with one entry
+    per distinct (segment, item) pair.
+    """
+    segment = np.concatenate([candidate[0] for candidate in candidates]).astype(np.int64)
+    item = np.concatenate([candidate[1] for candidate in candidates]).astype(np.int64)
+    keys, inverse = np.unique(segment * n_items + item, return_inverse=True)
+    pair_segment, pair_item = keys // n_items, keys % n_items
+
+    source_scores = np.zeros((len(keys), len(candidates)))
+    offset = 0
+    for column, (source_segment, _, score) in enumerate(candidates):
+        totals = np.bincount(inverse[offset:offset + len(source_segment)], weights=score, minlength=len(keys))
+        source_scores[:, column] = scale_by_segment(pair_segment, totals)
+        offset += len(source_segment)
+    return pair_segment, pair_item, source_scores @ np.asarray(weights, dtype=np.float64), source_scores
+
+
+################################### NAME RESOLUTION #######################################
+
+
+def decode_animes(anime_rows, path_anime2anime_decoded=ANIME2ANIME_DECODED, path_df=DF_PATH):
+    """(anime_id, eng_version) arrays for encoded anime rows, resolved in one gather."""
+    store = get_store()
+    decoder = store.anime_decoder(path_anime2anime_decoded)
+    anime_ids = decoder[np.asarray(anime_rows, dtype=np.int64)]
+    catalog = store.catalog(path_df)
+    rows = catalog.rows_by_id(anime_ids)
+    names = np.full(len(rows), None, dtype=object)
+    names[rows != MISSING] = catalog.eng_version[rows[rows != MISSING]]
+    return anime_ids, names
@@ -0,0 +1,333 @@
+import os
+import io
+import json
+import shutil
+from collections.abc import Mapping
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+META_FILE = "_meta.json"
+MISSING = -1
+
+
+def write_table(directory, columns, dtypes=None, block_rows=1048576, **meta):
+    """Writes each column as a typed .npy file plus a small JSON schema.
+
+    Columns are cast to `dtypes[name]` when given and copied block by block,
+    so memory-mapped inputs are never materialized whole. Columns may have
+    different lengths; extra keyword arguments are stored in the schema as
+    table-level metadata.
+    """
+    try:
+        os.makedirs(directory, exist_ok=True)
+        schema = {"columns": {}, "meta": meta}
+        for name, values in columns.items():
+            dtype = np.dtype((dtypes or {}).get(name, values.dtype))
+            out = np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+",
+                                            dtype=dtype, shape=(len(values),))
+            for start in range(0, len(values), block_rows):
+                out[start:start + block_rows] = values[start:start + block_rows]
+            out.flush()
+            del out
+            schema["columns"][name] = {"dtype": dtype.str, "length": int(len(values))}
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump(schema, f)
+        logger.info(f"Columnar table with columns {list(columns)} saved to {directory}")
+    except Exception as e:
+        logger.error(f"Error while writing columnar table {directory}: {str(e)}")
+        raise CustomException(f"Failed to write columnar table {directory}", e)
+
+
+def staging_path(directory):
+    """Where the next version of `directory` is written before it is swapped in."""
+    return directory.rstrip(os.sep) + ".new"
+
+
+def stage_table(directory, columns, dtypes=None, **meta):
+    """Writes a new version of a table beside the old one, without touching the old one."""
+    staging = staging_path(directory)
+    shutil.rmtree(staging, ignore_errors=True)
+    write_table(staging, columns, dtypes=dtypes, **meta)
+    return staging
+
+
+def swap_staged(directory):
+    """Moves the staged version of `directory` (a table or any directory) into place.
+
+    The old version is renamed away first, so readers never see a
+    half-written directory and files that may still be memory-mapped are
+    never overwritten.
+    """
+    retired = directory.rstrip(os.sep) + ".old"
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, retired)
+    os.rename(staging_path(directory), directory)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def replace_table(directory, columns, dtypes=None, **meta):
+    """Writes a new version of a table beside the old one, then swaps it in.
+
+    The new files never overwrite ones that may still be memory-mapped
+    (including the input columns), and readers never see a half-written
+    table under `directory`.
+    """
+    stage_table(directory, columns, dtypes=dtypes, **meta)
+    swap_staged(directory)
+
+
+def _write_schema(directory, schema):
+    path = os.path.join(directory, META_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(schema, f)
+    os.replace(path + ".tmp", path)
+
+
+def write_rows(path, values, start=None):
+    """Writes `values` into a one-dimensional .npy file from row `start` on (its end by default), in place.
+
+    The file grows as needed and only the written rows and the header are
+    touched; the header is updated last, so readers of the old rows are
+    unaffected until then. Files whose header has no room for the longer
+    shape (older NumPy) are rewritten once. Returns the previous length.
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        (length,), _, dtype = read_header(f)
+        offset = f.tell()
+        start = length if start is None else start
+        if start > length:
+            raise ValueError(f"Cannot write from row {start} of {path}, which has {length} rows")
+        values = np.ascontiguousarray(values, dtype=dtype)
+        header = io.BytesIO()
+        write_header = np.lib.format.write_array_header_1_0 if version == (1, 0) else np.lib.format.write_array_header_2_0
+        write_header(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (max(length, start + len(values)),)})
+        if len(header.getvalue()) == offset:
+            f.seek(offset + start * dtype.itemsize)
+            f.write(values.tobytes())
+            f.flush()
+            f.seek(0)
+            f.write(header.getvalue())
+            return length
+
+    old = np.load(path, mmap_mode="r")
+    out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=dtype, shape=(max(length, start + len(values)),))
+    out[:start] = old[:start]
+    out[start:start + len(values)] = values
+    out[start + len(values):] = old[start + len(values):]
+    out.flush()
+    del out, old
+    os.replace(path + ".tmp", path)
+    return length
+
+
+def append_rows(directory, columns, at=None, **meta):
+    """Adds rows to columns of an existing table in place and merges `meta` into its schema.
+
+    The rows go at the end of each column, or before row `at`, in which
+    case the rows after `at` are read and written back after them, so
+    inserting stays cheap when that tail is short (e.g. a test split kept
+    last). Nothing else in the files is rewritten.
+    """
+    try:
+        schema = read_schema(directory)
+        for name, values in columns.items():
+            path = os.path.join(directory, f"{name}.npy")
+            if at is not None:
+                values = np.concatenate([np.asarray(values), np.load(path, mmap_mode="r")[at:]])
+            write_rows(path, values, start=at)
+            schema["columns"][name]["length"] = int(np.load(path, mmap_mode="r").shape[0])
+        schema["meta"].update(meta)
+        _write_schema(directory, schema)
+    except Exception as e:
+        logger.error(f"Error while appending to columnar table {directory}: {str(e)}")
+        raise CustomException(f"Failed to append to columnar table {directory}", e)
+
+
+def update_table(directory, columns, **meta):
+    """Replaces whole columns of an existing table and merges `meta` into its schema.
+
+    Each column is written beside the old file, then renamed over it, so
+    readers still memory-mapping the old one are unaffected.
+    """
+    try:
+        schema = read_schema(directory)
+        for name, values in columns.items():
+            path = os.path.join(directory, f"{name}.npy")
+            dtype = np.dtype(schema["columns"][name]["dtype"]) if name in schema["columns"] else np.asarray(values).dtype
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, np.asarray(values, dtype=dtype))
+            os.replace(path + ".tmp", path)
+            schema["columns"][name] = {"dtype": dtype.str, "length": int(len(values))}
+        schema["meta"].update(meta)
+        _write_schema(directory, schema)
+    except Exception as e:
+        logger.error(f"Error while updating columnar table {directory}: {str(e)}")
+        raise CustomException(f"Failed to update columnar table {directory}", e)
+
+
+def create_table(directory, lengths, dtypes, **meta):
+    """Creates a table of zero-filled columns and returns them memory-mapped, to be filled in place.
+
+    The caller flushes and drops the returned arrays once they are written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns, schema = {}, {"columns": {}, "meta": meta}
+    for name, dtype in dtypes.items():
+        dtype = np.dtype(dtype)
+        columns[name] = np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+",
+                                                  dtype=dtype, shape=(int(lengths[name]),))
+        schema["columns"][name] = {"dtype": dtype.str, "length": int(lengths[name])}
+    _write_schema(directory, schema)
+    return columns
+
+
+def row_positions(starts, stops, rows):
+    """Lengths of `rows` of a pointer table and the positions of their entries, row after row.
+
+    Pointer tables keep row `r` in `column[starts[r]:stops[r]]` of each of
+    their data columns; rows need not be contiguous or in order.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    row_starts = np.asarray(starts[rows], dtype=np.int64)
+    lengths = np.asarray(stops[rows], dtype=np.int64) - row_starts
+    positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(row_starts, lengths)
+    return lengths, positions
+
+
+def replace_rows(directory, rows, lengths, data, row_data=None, compact_ratio=2.0, **meta):
+    """Gives `rows` of a pointer table new contents, writing only those contents and the pointers.
+
+    `data` holds the new entries of `rows` for every data column,
+    concatenated in `rows` order with `lengths[i]` entries for row i. They
+    are appended to the data columns and the rows repointed at them, so the
+    old entries stay behind unreferenced. Rows past the end grow the table,
+    `row_data` holding the per-row columns of those new rows. Once the data
+    columns are more than `compact_ratio` times the live entries, the table
+    is compacted, which keeps updates amortized to the size of the change.
+    """
+    try:
+        pointers, _ = read_table(directory, columns=["starts", "stops"], mmap_mode=None)
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        n_rows = max(len(pointers["starts"]), int(rows.max()) + 1 if len(rows) else 0)
+        starts, stops = (np.concatenate([pointers[name], np.zeros(n_rows - len(pointers[name]), dtype=np.int64)])
+                         for name in ("starts", "stops"))
+        size = read_schema(directory)["columns"][next(iter(data))]["length"]
+        starts[rows] = size + np.cumsum(lengths) - lengths
+        stops[rows] = starts[rows] + lengths
+
+        # Entries first, pointers last: the old pointers stay valid until they are replaced
+        append_rows(directory, dict(data, **(row_data or {})))
+        update_table(directory, {"starts": starts, "stops": stops}, **meta)
+        live = int((stops - starts).sum())
+        if size + int(lengths.sum()) > compact_ratio * max(live, 1):
+            compact_table(directory, list(data))
+    except CustomException:
+        raise
+    except Exception as e:
+        logger.error(f"Error while replacing rows of {directory}: {str(e)}")
+        raise CustomException(f"Failed to replace rows of {directory}", e)
+
+
+def compact_table(directory, data_columns, block_entries=1048576):
+    """Rewrites a pointer table with its rows contiguous and in order, dropping unreferenced entries.
+
+    The new version is staged and swapped in, copying about
+    `block_entries` entries at a time.
+    """
+    columns, meta = read_table(directory)
+    schema = read_schema(directory)["columns"]
+    starts, stops = np.asarray(columns.pop("starts"), dtype=np.int64), np.asarray(columns.pop("stops"), dtype=np.int64)
+    indptr = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(stops - starts, out=indptr[1:])
+
+    staging = staging_path(directory)
+    shutil.rmtree(staging, ignore_errors=True)
+    lengths = {name: indptr[-1] if name in data_columns else len(values) for name, values in columns.items()}
+    out = create_table(staging, dict(lengths, starts=len(starts), stops=len(starts)),
+                       dict({name: schema[name]["dtype"] for name in columns}, starts=np.int64, stops=np.int64), **meta)
+    out["starts"][:], out["stops"][:] = indptr[:-1], indptr[1:]
+    for name in columns:
+        if name not in data_columns:
+            out[name][:] = columns[name]
+    start = 0
+    while start < len(starts):
+        stop = min(len(starts), max(start + 1, int(np.searchsorted(indptr, indptr[start] + block_entries, side="right")) - 1))
+        _, positions = row_positions(starts, stops, np.arange(start, stop))
+        for name in data_columns:
+            out[name][indptr[start]:indptr[stop]] = columns[name][positions]
+        start = stop
+    for values in out.values():
+        values.flush()
+    del out, columns
+    swap_staged(directory)
+    logger.info(f"Compacted {directory} to {int(indptr[-1])} entries")
+
+
+def table_exists(directory):
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+
+def read_schema(directory):
+    with open(os.path.join(directory, META_FILE)) as f:
+        return json.load(f)
+
+
+def read_table(directory, columns=None, mmap_mode="r"):
+    """Reads the requested columns (all by default), memory-mapped unless mmap_mode is None.
+
+    Returns (columns dict, table metadata).
+    """
+    try:
+        schema = read_schema(directory)
+        names = columns or list(schema["columns"])
+        data = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+        return data, schema["meta"]
+    except Exception as e:
+        logger.error(f"Error while reading columnar table {directory}: {str(e)}")
+        raise CustomException(f"Failed to read columnar table {directory}", e)
+
+
+def dense_encoder(ids):
+    """Direct-address array mapping each id to its position in `ids` (MISSING elsewhere)."""
+    ids = np.asarray(ids, dtype=np.int64)
+    encoder = np.full(int(ids.max()) + 1 if len(ids) else 0, MISSING, dtype=np.int32)
+    encoder[ids] = np.arange(len(ids), dtype=np.int32)
+    return encoder
+
+
+class DenseMap(Mapping):
+    """Read-only dict view over a dense array, used in place of pickled id dicts.
+
+    `values[key]` is the value for integer `key`; MISSING marks absent keys.
+    Iteration follows `keys` so it matches the insertion order of the dicts
+    it replaces.
+    """
+
+    def __init__(self, values, keys=None):
+        self.values_array = values
+        self.keys_array = keys if keys is not None else np.arange(len(values))
+
+    def __getitem__(self, key):
+        try:
+            key = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        if 0 <= key < len(self.values_array):
+            value = self.values_array[key]
+            if value != MISSING:
+                return int(value)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (int(key) for key in self.keys_array)
+
+    def __len__(self):
+        return len(self.keys_array)
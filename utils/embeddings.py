@@ -0,0 +1,139 @@
+import os
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _scales_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}.scales{ext}"
+
+
+class EmbeddingTable:
+    """Embedding matrix stored as float32, float16 or int8 codes with per-row scales.
+
+    `codes` is usually a read-only memmap, so forked workers share its pages.
+    Rows are dequantized to float32 only when they are read, and full-table
+    products are computed in blocks so the table is never copied as a whole.
+    """
+
+    def __init__(self, codes, scales=None, block_rows=65536):
+        self.codes = codes
+        self.scales = scales
+        self.block_rows = block_rows
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, rows):
+        return self.rows(rows)
+
+    def rows(self, rows):
+        """Dequantized float32 copy of the selected rows."""
+        out = np.asarray(self.codes[rows], dtype=np.float32)
+        if self.scales is not None:
+            out *= np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+        return out
+
+    def dot(self, queries):
+        """`queries @ table.T` without materializing the dequantized table."""
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.codes.dtype == np.float32:
+            return queries @ self.codes.T
+
+        out = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            stop = min(start + self.block_rows, len(self))
+            out[:, start:stop] = queries @ np.asarray(self.codes[start:stop], dtype=np.float32).T
+        if self.scales is not None:
+            out *= np.asarray(self.scales, dtype=np.float32)
+        return out
+
+
+def as_embedding_table(weights):
+    """Wraps a plain array so every consumer can use the EmbeddingTable API."""
+    if isinstance(weights, EmbeddingTable):
+        return weights
+    return EmbeddingTable(np.asarray(weights, dtype=np.float32))
+
+
+def quantize(weights, dtype="float32"):
+    """Returns (codes, scales) for `weights`; scales is None unless dtype is int8."""
+    weights = np.asarray(weights, dtype=np.float32)
+    if dtype == "float32":
+        return weights, None
+    if dtype == "float16":
+        return weights.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(weights).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(weights / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unsupported embedding dtype {dtype}, expected one of {DTYPES}")
+
+
+def save_embeddings(weights, path, dtype="float32"):
+    """Writes `weights` as a raw .npy file (plus a .scales.npy file for int8)."""
+    try:
+        codes, scales = quantize(weights, dtype)
+        np.save(path, codes)
+        if scales is not None:
+            np.save(_scales_path(path), scales)
+        elif os.path.exists(_scales_path(path)):
+            os.remove(_scales_path(path))
+        logger.info(f"Embeddings {codes.shape} saved to {path} as {dtype}")
+    except Exception as e:
+        logger.error(f"Error while saving embeddings to {path}: {str(e)}")
+        raise CustomException(f"Failed to save embeddings to {path}", e)
+
+
+def load_embeddings(path, mmap_mode="r"):
+    """Memory-maps an embedding file written by `save_embeddings`."""
+    try:
+        codes = np.load(path, mmap_mode=mmap_mode)
+        scales = np.load(_scales_path(path), mmap_mode=mmap_mode) if os.path.exists(_scales_path(path)) else None
+        logger.info(f"Embeddings {codes.shape} loaded from {path} as {codes.dtype}")
+        return EmbeddingTable(codes, scales)
+    except Exception as e:
+        logger.error(f"Error while loading embeddings from {path}: {str(e)}")
+        raise CustomException(f"Failed to load embeddings from {path}", e)
+
+
+def quantization_report(weights, dtypes=DTYPES, k=10, sample_size=1000, seed=0):
+    """Compares top-k neighbours of each quantized format against full precision.
+
+    Returns {dtype: {"recall": .., "max_score_error": .., "bytes": ..}}.
+    """
+    from utils.similarity import SimilarityEngine
+
+    weights = np.asarray(weights, dtype=np.float32)
+    rows = np.random.default_rng(seed).choice(len(weights), min(sample_size, len(weights)), replace=False)
+    exact_ids, exact_scores = SimilarityEngine(weights).top_k(rows, k, exclude_self=True)
+
+    report = {}
+    for dtype in dtypes:
+        codes, scales = quantize(weights, dtype)
+        table = EmbeddingTable(codes, scales)
+        ids, _ = SimilarityEngine(table).top_k(rows, k, exclude_self=True)
+        hits = sum(len(np.intersect1d(a, e)) for a, e in zip(ids, exact_ids))
+
+        # Score error of the true neighbours when computed from the quantized rows
+        approx_scores = np.einsum("qd,qkd->qk", table.rows(rows), table.rows(exact_ids))
+        report[dtype] = {
+            "recall": hits / max(1, exact_ids.size),
+            "max_score_error": float(np.abs(approx_scores - exact_scores).max()) if exact_scores.size else 0.0,
+            "bytes": int(codes.nbytes + (scales.nbytes if scales is not None else 0)),
+        }
+    return report
@@ -0,0 +1,20 @@
+import numpy as np
+from scipy.stats import rankdata
+
+
+def ranking_auc(user_weights, anime_weights, user, anime, rating):
+    """AUC of embedding cosine scores at ranking held-out ratings above the median over the rest.
+
+    Both training engines export normalized tables that are only used
+    through cosine similarity, so this compares them on equal terms.
+    """
+    user = np.asarray(user, dtype=np.int64)
+    anime = np.asarray(anime, dtype=np.int64)
+    rating = np.asarray(rating)
+    scores = np.einsum("ij,ij->i", user_weights[user], anime_weights[anime])
+    liked = rating > np.median(rating)
+    n_pos, n_neg = int(liked.sum()), int((~liked).sum())
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+    ranks = rankdata(scores)
+    return float((ranks[liked].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
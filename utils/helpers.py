@@ -1,122 +1,99 @@
 import pandas as pd
 import numpy as np
-import joblib
 from config.paths_config import *
+from utils.recommender_store import get_store
+from utils.anime_catalog import MISSING
+from utils.batch_helpers import segment_top_n
+from utils.serving_metrics import serving_metrics
+from src.logger import get_logger
+
+logger = get_logger(__name__)
 ########################## ANIME FRAME #################################33
 
 def getAnimeFrame(anime , path_df):
-    df = pd.read_csv(path_df)
-    if isinstance(anime, int):
-        return df[df.anime_id == anime]
-    if isinstance(anime, str):
-        return df[df.eng_version == anime]
+    return get_store().catalog(path_df).frame(anime)
     
 #############################  ANIME SYNPOSIS #############################333333
 
 def getSypnopsis(anime,path_sypnopsis_df):
-    sypnopsis_df = pd.read_csv(path_sypnopsis_df)
-    if isinstance(anime, int):
-        return sypnopsis_df[sypnopsis_df.MAL_ID == anime].sypnopsis.values[0]
-    if isinstance(anime, str):
-        return sypnopsis_df[sypnopsis_df.Name == anime].sypnopsis.values[0]
+    return get_store().catalog(path_synopsis=path_sypnopsis_df).synopsis_of(anime)
     
 
 ####################################    CONTENT BASED RECOMMNDATION ###########################################
 
-def find_similar_animes(name, path_anime_weights , path_anime2anime_encoded , path_anime2anime_decoded, path_df , synopsis_df , n=10, return_dist=False, neg=False):
-    try:
-
-        anime2anime_encoded = joblib.load(path_anime2anime_encoded)
-        anime_weights = joblib.load(path_anime_weights)
-        anime2anime_decoded = joblib.load(path_anime2anime_decoded)
+def _similar_animes_frame(catalog, anime2anime_decoded, index, closest, similarities):
+    decoded_ids = [anime2anime_decoded.get(close) for close in closest]
 
-        index = getAnimeFrame(name,path_df).anime_id.values[0]
-        encoded_index = anime2anime_encoded.get(index)
+    # Resolve every neighbour in one gather; unknown ids raise as before
+    rows = catalog.rows_by_id(decoded_ids, strict=True)
+    sypnopsis = catalog.synopses(decoded_ids, strict=True)
 
-        weights = anime_weights
-        
-        
-        dists = np.dot(weights, weights[encoded_index])
-        sorted_dists = np.argsort(dists)
-        
-       
-        n = n + 1            
-        
-        if neg:
-            closest = sorted_dists[:n]
-        else:
-            closest = sorted_dists[-n:]
+    SimilarityArr = {"anime_id": decoded_ids, "name": catalog.eng_version[rows],
+                     "similarity": similarities, "genre": catalog.genres[rows],
+                     "sypnopsis": sypnopsis}
 
-        print('Animes closest to {}'.format(name))
+    Frame = pd.DataFrame(SimilarityArr).sort_values(by="similarity", ascending=False)
+    return Frame[Frame.anime_id != index].drop(['anime_id'], axis=1)
 
 
-        
-        if return_dist:
-            return dists, closest
-        
-        
-        SimilarityArr = []
+@serving_metrics.timed("find_similar_animes")
+def find_similar_animes(name, path_anime_weights , path_anime2anime_encoded , path_anime2anime_decoded, path_df , synopsis_df , n=10, return_dist=False, neg=False):
+    try:
+        store = get_store()
+        anime2anime_encoded = store.get(path_anime2anime_encoded)
+        anime2anime_decoded = store.get(path_anime2anime_decoded)
+        engine = store.similarity(path_anime_weights)
 
-        for close in closest:
+        index = getAnimeFrame(name,path_df).anime_id.values[0]
+        encoded_index = anime2anime_encoded[index]
 
-            
-            decoded_id = anime2anime_decoded.get(close)
+        n = n + 1
+        ids, scores = engine.top_k([encoded_index], n, neg=neg)
+        closest, similarities = ids[0], scores[0]
 
-            
-            sypnopsis = getSypnopsis(decoded_id,synopsis_df)
+        logger.debug('Animes closest to {}'.format(name))
 
-            
-            anime_frame = getAnimeFrame(decoded_id,path_df)
-            
-            
-            anime_name = anime_frame.eng_version.values[0]
-            genre = anime_frame.Genres.values[0]
-            similarity = dists[close]
-            SimilarityArr.append({"anime_id": decoded_id, "name": anime_name,
-                                  "similarity": similarity,"genre": genre,
-                                  'sypnopsis': sypnopsis})
+        if return_dist:
+            # Keep the old ascending-by-similarity order of `closest`
+            return engine.scores([encoded_index])[0], closest if neg else closest[::-1]
 
-        Frame = pd.DataFrame(SimilarityArr).sort_values(by="similarity", ascending=False)
-        return Frame[Frame.anime_id != index].drop(['anime_id'], axis=1)
+        return _similar_animes_frame(store.catalog(path_df, synopsis_df), anime2anime_decoded,
+                                     index, closest, similarities)
 
     except:
-        print('{}!, Not Found in Anime list'.format(name))
+        serving_metrics.inc("recommender_stage_errors_total", stage="find_similar_animes")
+        logger.warning('{}!, Not Found in Anime list'.format(name))
+
 
 ################################# USER-BASED-RECOMMEND ##############################3333
 
 
 
 
+@serving_metrics.timed("find_similar_users")
 def find_similar_users(item_input, path_user_weights , path_user_encoded , path_user_decoded, n=10,return_dist=False, neg=False):
     try:
-        user2user_encoded = joblib.load(path_user_encoded)
-        user2user_decoded = joblib.load(path_user_decoded)
-        user_weights = joblib.load(path_user_weights)
-
+        store = get_store()
+        user2user_encoded = store.get(path_user_encoded)
+        user2user_decoded = store.get(path_user_decoded)
+        engine = store.similarity(path_user_weights)
 
         index = item_input
-        encoded_index = user2user_encoded.get(index)
-        weights = user_weights
-    
-        dists = np.dot(weights, weights[encoded_index])
-        sorted_dists = np.argsort(dists)
-        
+        encoded_index = user2user_encoded[index]
+
         n = n + 1
-        
-        if neg:
-            closest = sorted_dists[:n]
-        else:
-            closest = sorted_dists[-n:]
+        ids, scores = engine.top_k([encoded_index], n, neg=neg)
+        closest, similarities = ids[0], scores[0]
 
-        print('> users similar to #{}'.format(item_input))
+        logger.debug('> users similar to #{}'.format(item_input))
 
         if return_dist:
-            return dists, closest
+            # Keep the old ascending-by-similarity order of `closest`
+            return engine.scores([encoded_index])[0], closest if neg else closest[::-1]
         
         SimilarityArr = []
         
-        for close in closest:
-            similarity = dists[close]
+        for close, similarity in zip(closest, similarities):
 
             if isinstance(item_input, int):
                 decoded_id = user2user_decoded.get(close)
@@ -130,79 +107,89 @@ def find_similar_users(item_input, path_user_weights , path_user_encoded , path_
         return similar_users
     
     except:
-        print('{}!, Not Found in User list'.format(item_input))
+        serving_metrics.inc("recommender_stage_errors_total", stage="find_similar_users")
+        logger.warning('{}!, Not Found in User list'.format(item_input))
 
 
+@serving_metrics.timed("get_user_preferences")
 def get_user_preferences(user_id, path_rating_df , path_df , verbose=0):
 
-    rating_df = pd.read_csv(path_rating_df)
-    df = pd.read_csv(path_df)
+    store = get_store()
+    df = store.get(path_df)
+    rating_index = store.rating_index(path_rating_df)
 
-    ## retrieves all anime that the user has rated.
-    animes_watched_by_user = rating_df[rating_df.user_id==user_id]
+    ## retrieves all anime that the user has rated, as a slice of the CSR index.
+    anime_ids, ratings = rating_index.user_ratings(user_id)
 
     ## This means it finds the rating value that is higher than 75% of the ratings given by the user.
     ## Basically it is finding top ratings by user...
-    user_rating_percentile = np.percentile(animes_watched_by_user.rating, 75)
+    user_rating_percentile = np.percentile(ratings, 75)
 
     ## Filters out all ratings below the 75th percentile, keeping only the user's highest-rated anime.
-    animes_watched_by_user = animes_watched_by_user[animes_watched_by_user.rating >= user_rating_percentile]
-
-    ## Sorts the user's top-rated anime in descending order of ratings.
-    top_animes_user = (
-        animes_watched_by_user.sort_values(by="rating", ascending=False)#.head(10)
-        .anime_id.values
-    )
+    liked = ratings >= user_rating_percentile
+    top_animes_user = anime_ids[liked]
     
-    ## Extract only those highly rated anime from main dataframe
-    anime_df_rows = df[df["anime_id"].isin(top_animes_user)]
+    ## Extract only those highly rated anime from main dataframe, keeping its row order
+    rows = np.unique(store.catalog(path_df).rows_by_id(top_animes_user))
+    anime_df_rows = df.iloc[rows[rows != MISSING]]
     anime_df_rows = anime_df_rows[["eng_version", "Genres"]]
     
     if verbose != 0:
         print("> User #{} has rated {} movies (avg. rating = {:.1f})".format(
-          user_id, len(animes_watched_by_user),
-          animes_watched_by_user['rating'].mean(),
+          user_id, int(liked.sum()),
+          ratings[liked].mean(),
         ))
         
     return anime_df_rows
 
 
-def get_top_recommended_animes(similar_users, user_pref, path_df, synopsis_df, path_rating_df, n=10):
+@serving_metrics.timed("get_top_recommended_animes")
+def get_top_recommended_animes(similar_users, user_pref, path_df, synopsis_df, path_rating_df, n=10, user_id=None):
     recommended_animes = []
-    anime_list = []
-
-    ## Loop through Similar Users
-    for user_id in similar_users.similar_users.values:
-        pref_list = get_user_preferences(int(user_id), path_rating_df, path_df, verbose=0)
-
-        # Filter out animes already rated by the current user
-        pref_list = pref_list[~pref_list.eng_version.isin(user_pref.eng_version.values)]
-
-        if not pref_list.empty:
-            anime_list.append(pref_list.eng_version.values)
-
-    if anime_list:
-        anime_list = pd.DataFrame(anime_list)
-        
-        # Get the top n recommended animes
-        sorted_list = pd.DataFrame(pd.Series(anime_list.values.ravel()).value_counts()).head(n)
-
-        for i, anime_name in enumerate(sorted_list.index):
-            n_user_pref = sorted_list[sorted_list.index == anime_name].values[0][0]
-            if isinstance(anime_name, str):
-                try:
-                    frame = getAnimeFrame(anime_name, path_df)
-                    anime_id = frame.anime_id.values[0]
-                    genre = frame.Genres.values[0]
-                    sypnopsis = getSypnopsis(int(anime_id), synopsis_df)
-                    recommended_animes.append({
-                        "n": n_user_pref,
-                        "anime_name": anime_name,
-                        "Genres": genre,
-                        "sypnopsis": sypnopsis
-                    })
-                except Exception as e:
-                    print(f"Error fetching details for {anime_name}: {e}")
+    store = get_store()
+    rating_index = store.rating_index(path_rating_df)
+
+    ## One sparse row-sum over the similar users' liked animes, skipping the ones the current
+    ## user liked by encoded anime index (taken from user_pref when user_id is not given)
+    similar_rows = rating_index.rows(similar_users.similar_users.values).reshape(1, -1)
+    user_rows = rating_index.rows([user_id]) if user_id is not None else np.array([MISSING])
+    liked_matrix = store.liked_matrix(path_rating_df)
+    _, anime, votes = liked_matrix.votes(user_rows, similar_rows)
+
+    catalog = store.catalog(path_df, synopsis_df)
+    anime_ids = store.anime_decoder()[anime]
+    rows = catalog.rows_by_id(anime_ids)
+    keep = rows != MISSING
+    ## Animes without a usable name are never recommended, as value_counts() dropped NaN names
+    keep[keep] = [isinstance(name, str) for name in catalog.eng_version[rows[keep]]]
+    if user_id is None:
+        keep &= ~np.isin(anime_ids, store.get(path_df).loc[user_pref.index, "anime_id"].values)
+
+    if keep.any():
+        ## Ties go to the anime listed first when the similar users' liked animes are concatenated,
+        ## most similar user first and in anime_df order, as value_counts() kept them
+        first_seen = np.lexsort((rows, liked_matrix.first_liked(similar_rows)[anime]))
+        tie_rank = np.empty(len(anime), dtype=np.int64)
+        tie_rank[first_seen] = np.arange(len(anime))
+
+        # Get the top n recommended animes, most votes first
+        _, top, counts = segment_top_n(np.zeros(int(keep.sum()), dtype=np.int64), tie_rank[keep], votes[keep], n)
+        top = first_seen[top]
+        rows, anime_ids = rows[top], anime_ids[top]
+        anime_names = catalog.eng_version[rows]
+
+        sypnopsis_rows = catalog.synopsis_rows_by_id(anime_ids)
+        found = sypnopsis_rows != MISSING
+
+        for anime_name in np.asarray(anime_names, dtype=object)[~found]:
+            logger.warning(f"Error fetching details for {anime_name}: not found in anime catalog")
+
+        recommended_animes = pd.DataFrame({
+            "n": counts[found].astype(np.int64),
+            "anime_name": np.asarray(anime_names, dtype=object)[found],
+            "Genres": catalog.genres[rows[found]],
+            "sypnopsis": catalog.synopsis[sypnopsis_rows[found]]
+        })
 
     return pd.DataFrame(recommended_animes).head(n)  # Only return the top n recommendations
 
@@ -0,0 +1,64 @@
+import time
+import numpy as np
+import tensorflow as tf
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+
+def make_dataset(user, anime, rating, batch_size, shuffle_buffer=None, block_rows=65536,
+                 num_parallel_calls=tf.data.AUTOTUNE, seed=None):
+    """Streams (user, anime) -> rating batches from (memory-mapped) column arrays.
+
+    Rows are read in contiguous blocks by a parallel map, so only the blocks
+    in flight and the shuffle buffer are held in memory. With
+    `shuffle_buffer` set, block order is reshuffled every epoch and rows are
+    mixed across blocks in a buffer of that many rows.
+    """
+    try:
+        n_rows = len(rating)
+
+        def read_block(start):
+            stop = min(int(start) + block_rows, n_rows)
+            return (np.asarray(user[start:stop], dtype=np.int32),
+                    np.asarray(anime[start:stop], dtype=np.int32),
+                    np.asarray(rating[start:stop], dtype=np.float32))
+
+        def load(start):
+            users, animes, ratings = tf.numpy_function(read_block, [start], [tf.int32, tf.int32, tf.float32])
+            for column in (users, animes, ratings):
+                column.set_shape([None])
+            return users, animes, ratings
+
+        dataset = tf.data.Dataset.range(0, n_rows, block_rows)
+        if shuffle_buffer:
+            dataset = dataset.shuffle(-(-n_rows // block_rows), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.map(load, num_parallel_calls=num_parallel_calls, deterministic=not shuffle_buffer)
+        dataset = dataset.unbatch()
+        if shuffle_buffer:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+        dataset = dataset.map(lambda users, animes, ratings: (
+            {"user": tf.expand_dims(users, -1), "anime": tf.expand_dims(animes, -1)}, ratings),
+            num_parallel_calls=num_parallel_calls)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    except Exception as e:
+        logger.error(f"Error while building the input pipeline: {str(e)}")
+        raise CustomException("Failed to build the input pipeline", e)
+
+
+def measure_throughput(dataset, n_batches=50):
+    """Iterates `n_batches` of `dataset` without training and returns samples per second.
+
+    Comparing it with the samples per second reached by `model.fit` shows
+    whether training is input-bound.
+    """
+    samples = 0
+    iterator = iter(dataset)
+    next(iterator)  # Leave pipeline start-up out of the measurement
+    start = time.perf_counter()
+    for _, (_, ratings) in zip(range(n_batches), iterator):
+        samples += int(ratings.shape[0])
+    elapsed = time.perf_counter() - start
+    return samples / elapsed if elapsed > 0 else float("inf")
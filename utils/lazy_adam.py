@@ -0,0 +1,76 @@
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.utils import register_keras_serializable
+from src.logger import get_logger
+from config.paths_config import CONFIG_PATH
+
+logger = get_logger(__name__)
+
+
+@register_keras_serializable(package="anime_recommender")
+class LazyAdam(Adam):
+    """Adam that only touches the rows present in sparse (embedding) gradients.
+
+    Embedding lookups produce `tf.IndexedSlices` gradients covering just the
+    rows in the batch. Dense Adam would decay the moments of every row and
+    update the whole table each step; here the moments and weights of the
+    looked-up rows are gathered, updated and scattered back, so step cost
+    follows the batch instead of the table size. Rows absent from a batch
+    keep stale moments, as in the usual lazy Adam. Dense gradients use the
+    regular Adam update.
+    """
+
+    def update_step(self, gradient, variable, learning_rate):
+        if not isinstance(gradient, tf.IndexedSlices) or self.amsgrad:
+            return super().update_step(gradient, variable, learning_rate)
+
+        dtype = variable.dtype
+        lr = tf.cast(learning_rate, dtype)
+        local_step = tf.cast(self.iterations + 1, dtype)
+        beta_1 = tf.cast(self.beta_1, dtype)
+        beta_2 = tf.cast(self.beta_2, dtype)
+        alpha = lr * tf.sqrt(1 - tf.pow(beta_2, local_step)) / (1 - tf.pow(beta_1, local_step))
+
+        # A row looked up several times in the batch gets the sum of its gradients
+        rows, position = tf.unique(gradient.indices)
+        grad = tf.math.unsorted_segment_sum(tf.cast(gradient.values, dtype), position, tf.shape(rows)[0])
+
+        m = self._momentums[self._get_variable_index(variable)]
+        v = self._velocities[self._get_variable_index(variable)]
+        # Gather from the tf.Variable itself so only these rows are read, not a full copy
+        m_rows = beta_1 * tf.gather(m.value, rows) + (1 - beta_1) * grad
+        v_rows = beta_2 * tf.gather(v.value, rows) + (1 - beta_2) * tf.square(grad)
+
+        self.assign(m, tf.IndexedSlices(m_rows, rows))
+        self.assign(v, tf.IndexedSlices(v_rows, rows))
+        self.assign_sub(variable, tf.IndexedSlices(alpha * m_rows / (tf.sqrt(v_rows) + self.epsilon), rows))
+
+
+def benchmark_step_time(n_users_list=(10000, 100000, 400000), n_animes=20000, batch_size=10000,
+                        optimizers=("Adam", "LazyAdam"), steps=20, config_path=CONFIG_PATH):
+    """Median RecommenderNet train step time in ms for each optimizer and user-table size."""
+    from src.base_model import BaseModel  # Imported here, base_model imports this module
+
+    base_model = BaseModel(config_path=config_path)
+    rng = np.random.default_rng(0)
+    results = {}
+    for n_users in n_users_list:
+        x = [rng.integers(0, n_users, batch_size), rng.integers(0, n_animes, batch_size)]
+        y = rng.random(batch_size).astype(np.float32)
+        for name in optimizers:
+            model = base_model.RecommenderNet(n_users=n_users, n_animes=n_animes, optimizer=name)
+            model.train_on_batch(x, y)  # Build the optimizer state and trace the step
+            times = []
+            for _ in range(steps):
+                start = time.perf_counter()
+                model.train_on_batch(x, y)
+                times.append(time.perf_counter() - start)
+            results[(name, n_users)] = 1000 * float(np.median(times))
+            logger.info(f"{name} with {n_users} users: {results[(name, n_users)]:.1f} ms/step")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_step_time()
@@ -0,0 +1,103 @@
+import numpy as np
+import scipy.sparse as sp
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.columnar import write_table, read_table, row_positions
+
+logger = get_logger(__name__)
+
+
+class LikedMatrix:
+    """Sparse encoded-user x encoded-anime matrix of the animes each user liked.
+
+    A user likes the animes they rated at or above their own 75th
+    percentile, the rule get_user_preferences applies. Row `u` holds
+    `anime[starts[u]:stops[u]]`, so neighbour voting is one sparse product
+    instead of a loop over users. Incremental updates repoint the rows of
+    the users they touch, like UserRatingIndex.
+    """
+
+    def __init__(self, starts, stops, anime, n_animes):
+        self.starts = starts
+        self.stops = stops
+        self.anime = anime
+        self.n_animes = int(n_animes)
+        self._csr = None
+
+    @property
+    def n_users(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_rating_index(cls, rating_index, n_animes, q=75, block_users=65536):
+        """Applies the percentile rule to every user of a UserRatingIndex, a block of users at a time."""
+        indptrs, animes, offset = [np.zeros(1, dtype=np.int64)], [], 0
+        for start in range(0, rating_index.n_users, block_users):
+            indptr, anime = rating_index.liked(np.arange(start, min(start + block_users, rating_index.n_users)), q=q)
+            indptrs.append(indptr[1:] + offset)
+            animes.append(anime.astype(np.int32))
+            offset += len(anime)
+        anime = np.concatenate(animes) if animes else np.zeros(0, dtype=np.int32)
+        indptr = np.concatenate(indptrs)
+        return cls(indptr[:-1], indptr[1:], anime, n_animes)
+
+    def save(self, directory):
+        write_table(directory, {"starts": self.starts, "stops": self.stops, "anime": self.anime}, n_animes=self.n_animes)
+        logger.info(f"Liked matrix with {self.n_users} users and {len(self.anime)} entries saved to {directory}")
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Loads a matrix written by `save`, or one with the single indptr column older versions wrote."""
+        columns, meta = read_table(directory, mmap_mode=mmap_mode)
+        if "indptr" in columns:
+            columns["starts"], columns["stops"] = columns["indptr"][:-1], columns["indptr"][1:]
+        return cls(columns["starts"], columns["stops"], columns["anime"], meta["n_animes"])
+
+    def csr(self):
+        if self._csr is None:
+            lengths, positions = row_positions(self.starts, self.stops, np.arange(self.n_users))
+            indptr = np.zeros(self.n_users + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            self._csr = sp.csr_matrix((np.ones(len(positions), dtype=np.int32), np.asarray(self.anime[positions]), indptr),
+                                      shape=(self.n_users, self.n_animes))
+        return self._csr
+
+    def first_liked(self, rows):
+        """Position in `rows` of the first user who liked each anime, len(rows) where none did; MISSING rows are skipped."""
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        first = np.full(self.n_animes, len(rows), dtype=np.int64)
+        valid = np.flatnonzero((rows >= 0) & (rows < self.n_users))
+        lengths, positions = row_positions(self.starts, self.stops, rows[valid])
+        np.minimum.at(first, np.asarray(self.anime[positions], dtype=np.int64), np.repeat(valid, lengths))
+        return first
+
+    def _select(self, rows, n_queries, weights=None):
+        """Sparse (query x user) selector for a (n_queries, k) array of user rows; MISSING rows are skipped."""
+        rows = np.asarray(rows, dtype=np.int64).reshape(n_queries, -1)
+        query = np.repeat(np.arange(n_queries), rows.shape[1])
+        rows = rows.ravel()
+        valid = (rows >= 0) & (rows < self.n_users)
+        data = np.ones(int(valid.sum()), dtype=np.int32) if weights is None \
+            else np.asarray(weights, dtype=np.float64).ravel()[valid]
+        return sp.csr_matrix((data, (query[valid], rows[valid])), shape=(n_queries, self.n_users))
+
+    def votes(self, user_rows, similar_rows, weights=None):
+        """Votes each query user's similar users cast for animes the query user has not liked.
+
+        `weights`, shaped like `similar_rows`, weights each similar user's
+        vote, e.g. by their similarity; by default every vote counts 1.
+        Returns (query position, encoded anime, votes) for every positive total.
+        """
+        try:
+            n_queries = len(user_rows)
+            if n_queries == 0:
+                return tuple(np.zeros(0, dtype=dtype) for dtype in (np.int64, np.int64, np.float64))
+            matrix = self.csr()
+            votes = self._select(similar_rows, n_queries, weights) @ matrix
+            seen = self._select(user_rows, n_queries) @ matrix
+            votes = (votes - votes.multiply(seen > 0)).tocoo()
+            keep = votes.data > 0
+            return votes.row[keep].astype(np.int64), votes.col[keep].astype(np.int64), votes.data[keep].astype(np.float64)
+        except Exception as e:
+            logger.error(f"Error while counting neighbour votes: {str(e)}")
+            raise CustomException("Failed to count neighbour votes", e)
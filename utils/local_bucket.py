@@ -0,0 +1,29 @@
+import os
+import shutil
+
+
+class LocalBlob:
+    """File-backed stand-in for google.cloud.storage.Blob."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def download_to_filename(self, filename):
+        shutil.copyfile(self.path, filename)
+
+    def open(self, mode="rb", chunk_size=None):
+        return open(self.path, mode)
+
+
+class LocalBucket:
+    """Directory-backed stand-in for google.cloud.storage.Bucket.
+
+    Lets the ingestion path run and be benchmarked offline against files
+    laid out as `<root>/<blob name>`.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def blob(self, name):
+        return LocalBlob(os.path.join(self.root, name))
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import queue
+import threading
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class NullSink:
+    """Discards everything."""
+
+    def write(self, records):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """Appends one JSON object per metric or asset to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def write(self, records):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+        for record in records:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CometSink:
+    """Forwards records to a Comet experiment.
+
+    The experiment is created on first write, i.e. on the logger's
+    background thread, so a slow or unreachable server never blocks the
+    caller. `mode="offline"` records to a local archive for later upload.
+    """
+
+    def __init__(self, api_key=None, project_name=None, workspace=None, mode="online"):
+        self.settings = dict(api_key=api_key, project_name=project_name, workspace=workspace)
+        self.mode = mode
+        self._experiment = None
+
+    def experiment(self):
+        if self._experiment is None:
+            import comet_ml  # Optional dependency, only needed by this sink
+
+            if self.mode == "offline":
+                self._experiment = comet_ml.OfflineExperiment(**self.settings)
+            else:
+                self._experiment = comet_ml.Experiment(**self.settings)
+            logger.info(f"Comet experiment initialized in {self.mode} mode.")
+        return self._experiment
+
+    def write(self, records):
+        experiment = self.experiment()
+        for record in records:
+            if record["type"] == "asset":
+                experiment.log_asset(record["path"])
+            else:
+                experiment.log_metric(record["name"], record["value"], step=record.get("step"))
+
+    def close(self):
+        if self._experiment is not None:
+            self._experiment.end()
+
+
+class MetricsLogger:
+    """Buffered, non-blocking metric logger with pluggable sinks.
+
+    `log_metric` and `log_asset` only enqueue a record; a daemon thread
+    drains the queue in batches and hands them to every sink. When the
+    queue is full records are dropped and counted instead of blocking, and
+    a failing sink is logged and skipped, so training never waits on it.
+    Exposes the `log_metric` / `log_asset` calls used on comet experiments.
+    """
+
+    def __init__(self, sinks, queue_size=10000, flush_interval=1.0):
+        self.sinks = list(sinks)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="metrics-logger", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_config(cls, config, comet_settings=None):
+        """Builds the sinks listed under `tracking.sinks`: comet, jsonl and/or none."""
+        tracking_config = config.get("tracking", {})
+        sinks = []
+        for name in tracking_config.get("sinks", ["comet"]):
+            if name == "comet":
+                sinks.append(CometSink(mode=tracking_config.get("comet_mode", "online"), **(comet_settings or {})))
+            elif name == "jsonl":
+                sinks.append(JsonlSink(tracking_config.get("jsonl_path", "artifacts/metrics/metrics.jsonl")))
+            elif name == "none":
+                sinks.append(NullSink())
+            else:
+                raise ValueError(f"Unknown metrics sink {name}")
+        return cls(sinks, queue_size=tracking_config.get("queue_size", 10000),
+                   flush_interval=tracking_config.get("flush_interval_seconds", 1.0))
+
+    def _put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def log_metric(self, name, value, step=None):
+        self._put({"type": "metric", "name": name, "value": float(value), "step": step, "time": time.time()})
+
+    def log_metrics(self, metrics, step=None):
+        for name, value in metrics.items():
+            self.log_metric(name, value, step=step)
+
+    def log_asset(self, path):
+        self._put({"type": "asset", "path": path, "time": time.time()})
+
+    def _drain(self, timeout):
+        records = []
+        try:
+            records.append(self._queue.get(timeout=timeout))
+            while True:
+                records.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return records
+
+    def _write(self, records):
+        for sink in list(self.sinks):
+            try:
+                sink.write(records)
+            except Exception as e:
+                logger.error(f"Metrics sink {type(sink).__name__} failed and was disabled: {str(e)}")
+                self.sinks.remove(sink)
+
+    def _run(self):
+        while not (self._closed and self._queue.empty()):
+            records = self._drain(self.flush_interval)
+            if records:
+                self._write(records)
+
+    def close(self, timeout=30.0):
+        """Flushes queued records (waiting at most `timeout` seconds) and closes the sinks."""
+        self._closed = True
+        self._worker.join(timeout)
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.error(f"Error closing metrics sink {type(sink).__name__}: {str(e)}")
+        if self.dropped:
+            logger.warning(f"{self.dropped} metric records were dropped because the queue was full")
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.similarity import SimilarityEngine
+
+logger = get_logger(__name__)
+
+
+def weights_fingerprint(path, block_size=1 << 20):
+    """SHA-1 of a weights file, recorded with a neighbour table to detect retrained weights."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class NeighbourTable:
+    """Fixed-width table of the top-K most similar items for every item.
+
+    Row `i` of `ids` holds the encoded neighbours of item `i`, most similar
+    first and without `i` itself; `scores` holds the matching similarities.
+    `meta` records what the table was built from, e.g. a weights fingerprint.
+    """
+
+    def __init__(self, ids, scores, meta=None):
+        self.ids = ids
+        self.scores = scores
+        self.meta = meta or {}
+
+    @property
+    def width(self):
+        return self.ids.shape[1]
+
+    @classmethod
+    def build(cls, weights, top_k=50, block_size=1024):
+        """Computes every item's neighbours in blocks of `block_size` query rows."""
+        try:
+            engine = SimilarityEngine(weights, block_size=block_size)
+            ids, scores = engine.top_k(np.arange(engine.n_items), top_k, exclude_self=True)
+            logger.info(f"Neighbour table built for {engine.n_items} items with width {ids.shape[1]}")
+            return cls(ids.astype(np.int32), scores.astype(np.float32))
+        except Exception as e:
+            logger.error(f"Error while building neighbour table: {str(e)}")
+            raise CustomException("Failed to build neighbour table", e)
+
+    def save(self, ids_path, scores_path, meta_path=None):
+        try:
+            np.save(ids_path, self.ids)
+            np.save(scores_path, self.scores)
+            if meta_path:
+                with open(meta_path, "w") as file:
+                    json.dump(self.meta, file)
+            logger.info(f"Neighbour table saved to {ids_path} and {scores_path}")
+        except Exception as e:
+            logger.error(f"Error while saving neighbour table: {str(e)}")
+            raise CustomException("Failed to save neighbour table", e)
+
+    @classmethod
+    def load(cls, ids_path, scores_path, meta_path=None, mmap_mode="r"):
+        try:
+            meta = None
+            if meta_path and os.path.exists(meta_path):
+                with open(meta_path) as file:
+                    meta = json.load(file)
+            table = cls(np.load(ids_path, mmap_mode=mmap_mode), np.load(scores_path, mmap_mode=mmap_mode), meta)
+            logger.info(f"Neighbour table loaded from {ids_path}")
+            return table
+        except Exception as e:
+            logger.error(f"Error while loading neighbour table: {str(e)}")
+            raise CustomException("Failed to load neighbour table", e)
+
+    def top_k(self, rows, k):
+        """(ids, scores) of the first k stored neighbours of each row."""
+        if k > self.width:
+            raise ValueError(f"Requested {k} neighbours but the table only stores {self.width}")
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.asarray(self.ids[rows, :k], dtype=np.int64), np.asarray(self.scores[rows, :k])
@@ -0,0 +1,264 @@
+import os
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.columnar import write_table, read_table, table_exists, create_table, row_positions
+
+logger = get_logger(__name__)
+
+
+def _pointers(keys, n_rows):
+    """Stable order grouping `keys` by row, plus the (starts, stops) of each row in that order."""
+    keys = np.asarray(keys, dtype=np.int64)
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_rows), out=indptr[1:])
+    return np.argsort(keys, kind="stable"), indptr[:-1], indptr[1:]
+
+
+def _sort_on_disk(directory, counts, blocks, dtypes, row_columns):
+    """Counting-sorts entries into a pointer table written straight to memory-mapped files.
+
+    `counts` gives the number of entries of each row and `blocks` yields
+    (row, *data columns) arrays, the data columns in `dtypes` order. Entries
+    keep their order within a row and only one block is held in memory.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    # Columns in the order `save` writes them: pointers, per-row columns, then entries
+    lengths = dict({"starts": len(counts), "stops": len(counts)}, **{name: len(counts) for name in row_columns},
+                   **{name: indptr[-1] for name in dtypes})
+    out = create_table(directory, lengths, dict({"starts": np.int64, "stops": np.int64},
+                                                **{name: values.dtype for name, values in row_columns.items()}, **dtypes))
+    out["starts"][:], out["stops"][:] = indptr[:-1], indptr[1:]
+    for name, values in row_columns.items():
+        out[name][:] = values
+
+    cursor = indptr[:-1].copy()  # Next free position of each row
+    for row, *values in blocks:
+        row = np.asarray(row, dtype=np.int64)
+        order = np.argsort(row, kind="stable")
+        grouped = row[order]
+        # Rank of each entry among the block's entries of the same row
+        rank = np.arange(len(grouped)) - np.searchsorted(grouped, grouped, side="left")
+        positions = cursor[grouped] + rank
+        for name, value in zip(dtypes, values):
+            out[name][positions] = np.asarray(value)[order]
+        cursor += np.bincount(row, minlength=len(cursor))
+    if not np.array_equal(cursor, indptr[1:]):
+        raise ValueError("Blocks do not match the per-row counts")
+    for values in out.values():
+        values.flush()
+
+
+class UserRatingIndex:
+    """Index of ratings grouped by encoded user.
+
+    The ratings of encoded user `u` live in `anime_id[starts[u]:stops[u]]`
+    and `rating[starts[u]:stops[u]]`, so a user's history is a slice.
+    Freshly built indexes are plain CSR; incremental updates append the
+    new histories of the users they touch and repoint only those users.
+    """
+
+    DATA = {"anime_id": np.int64, "anime": np.int32, "rating": np.float32}
+
+    def __init__(self, starts, stops, user_id, anime_id, anime, rating):
+        self.starts = starts
+        self.stops = stops
+        self.user_id = user_id
+        self.anime_id = anime_id
+        self.anime = anime
+        self.rating = rating
+        self._row_by_user = {int(u): i for i, u in enumerate(user_id)}
+
+    @property
+    def n_users(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_frame(cls, rating_df):
+        """Builds the index from a DataFrame with user_id, user, anime_id, anime and rating columns."""
+        return cls.from_arrays(rating_df["user_id"], rating_df["user"], rating_df["anime_id"],
+                               rating_df["anime"], rating_df["rating"])
+
+    @classmethod
+    def from_arrays(cls, user_id, user, anime_id, anime, rating):
+        """Builds the index from parallel per-rating columns."""
+        users = np.asarray(user, dtype=np.int64)
+        n_users = int(users.max()) + 1 if len(users) else 0
+        order, starts, stops = _pointers(users, n_users)
+
+        user_ids = np.zeros(n_users, dtype=np.int64)
+        user_ids[users] = np.asarray(user_id, dtype=np.int64)
+
+        return cls(
+            starts=starts,
+            stops=stops,
+            user_id=user_ids,
+            anime_id=np.asarray(anime_id, dtype=np.int64)[order],
+            anime=np.asarray(anime, dtype=np.int32)[order],
+            rating=np.asarray(rating, dtype=np.float32)[order],
+        )
+
+    @classmethod
+    def build_on_disk(cls, directory, user_id, counts, blocks):
+        """Counting-sorts ratings into an index written straight to memory-mapped files under `directory`.
+
+        `user_id` and `counts` give the raw id and the rating count of each
+        encoded user; `blocks` yields (user, anime_id, anime, rating) arrays.
+        Rows keep their order within a user, as in `from_arrays`, and only
+        one block plus the per-user arrays are held in memory.
+        """
+        try:
+            _sort_on_disk(directory, counts, blocks, cls.DATA, {"user_id": np.asarray(user_id, dtype=np.int64)})
+            logger.info(f"User rating index with {len(counts)} users built in {directory}")
+        except Exception as e:
+            logger.error(f"Error while building the user rating index in {directory}")
+            raise CustomException("Failed to build user rating index", e)
+        return cls.load(directory)
+
+    def save(self, directory):
+        """Writes the index as a columnar table so readers can memory-map it."""
+        try:
+            write_table(directory, {name: getattr(self, name)
+                                    for name in ("starts", "stops", "user_id", *self.DATA)})
+            logger.info(f"User rating index with {self.n_users} users saved to {directory}")
+        except Exception as e:
+            logger.error(f"Error while saving the user rating index to {directory}")
+            raise CustomException("Failed to save user rating index", e)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Loads an index written by `save`, or the plain indptr files older versions wrote."""
+        try:
+            if table_exists(directory):
+                arrays, _ = read_table(directory, mmap_mode=mmap_mode)
+            else:
+                arrays = {column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode=mmap_mode)
+                          for column in ("indptr", "user_id", *cls.DATA)}
+                indptr = arrays.pop("indptr")
+                arrays["starts"], arrays["stops"] = indptr[:-1], indptr[1:]
+            logger.info(f"User rating index loaded from {directory}")
+            return cls(**arrays)
+        except Exception as e:
+            logger.error(f"Error while loading the user rating index from {directory}")
+            raise CustomException("Failed to load user rating index", e)
+
+    def row(self, user_id):
+        """Encoded row of a raw user id."""
+        try:
+            return self._row_by_user[int(user_id)]
+        except KeyError:
+            raise KeyError(f"User {user_id} not found in rating index")
+
+    def rows(self, user_ids):
+        """Encoded rows of many raw user ids, -1 for unknown users."""
+        return np.array([self._row_by_user.get(int(user_id), -1) for user_id in user_ids], dtype=np.int64)
+
+    def user_slice(self, user_id):
+        """Positions of `user_id`'s ratings in the column arrays."""
+        row = self.row(user_id)
+        return slice(int(self.starts[row]), int(self.stops[row]))
+
+    def user_ratings(self, user_id):
+        """(anime_id, rating) arrays for every anime rated by `user_id`."""
+        span = self.user_slice(user_id)
+        return self.anime_id[span], self.rating[span]
+
+    def ratings(self, rows):
+        """(user, anime, rating) arrays of every rating of the encoded users `rows`."""
+        lengths, positions = row_positions(self.starts, self.stops, rows)
+        return (np.repeat(np.asarray(rows, dtype=np.int64), lengths), np.asarray(self.anime[positions], dtype=np.int64),
+                np.asarray(self.rating[positions]))
+
+    def liked(self, rows, q=75):
+        """Animes each user in `rows` rated at or above their own q-th percentile.
+
+        Returns (indptr, anime) in CSR layout over `rows`. The percentile is
+        computed per user with the same linear interpolation as np.percentile,
+        but for all users at once.
+        """
+        lengths, positions = row_positions(self.starts, self.stops, rows)
+        seg_starts = np.cumsum(lengths) - lengths
+
+        # Every selected rating, grouped by user
+        segment = np.repeat(np.arange(len(lengths)), lengths)
+        ratings = np.asarray(self.rating[positions])
+        sorted_ratings = ratings[np.lexsort((ratings, segment))]
+
+        # np.percentile "linear" method, vectorized over users
+        has_ratings = lengths > 0
+        virtual = (q / 100.0) * (lengths[has_ratings] - 1)
+        previous = np.floor(virtual).astype(np.int64)
+        following = np.minimum(previous + 1, lengths[has_ratings] - 1)
+        gamma = (virtual - previous).astype(ratings.dtype)
+        lower = sorted_ratings[seg_starts[has_ratings] + previous]
+        upper = sorted_ratings[seg_starts[has_ratings] + following]
+        diff = upper - lower
+        percentile = np.where(gamma >= 0.5, upper - diff * (1 - gamma), lower + diff * gamma)
+
+        thresholds = np.full(len(lengths), np.inf, dtype=ratings.dtype)
+        thresholds[has_ratings] = percentile
+        keep = ratings >= thresholds[segment]
+
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(segment[keep], minlength=len(lengths)), out=indptr[1:])
+        return indptr, np.asarray(self.anime[positions[keep]], dtype=np.int64)
+
+
+class AnimeRatingIndex:
+    """Training ratings grouped by encoded anime, laid out like UserRatingIndex.
+
+    The ratings of encoded anime `a` are `user[starts[a]:stops[a]]` and
+    `rating[starts[a]:stops[a]]`. Incremental training reads the ratings of
+    the animes it touches from here instead of scanning the training split.
+    """
+
+    DATA = {"user": np.int32, "rating": np.float32}
+
+    def __init__(self, starts, stops, user, rating):
+        self.starts = starts
+        self.stops = stops
+        self.user = user
+        self.rating = rating
+
+    @property
+    def n_animes(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_arrays(cls, user, anime, rating, n_animes):
+        """Builds the index from parallel per-rating columns."""
+        order, starts, stops = _pointers(anime, n_animes)
+        return cls(starts=starts, stops=stops, user=np.asarray(user, dtype=np.int32)[order],
+                   rating=np.asarray(rating, dtype=np.float32)[order])
+
+    @classmethod
+    def build_on_disk(cls, directory, counts, blocks):
+        """Counting-sorts ratings into an index under `directory`; `blocks` yields (anime, user, rating) arrays."""
+        try:
+            _sort_on_disk(directory, counts, blocks, cls.DATA, {})
+            logger.info(f"Anime rating index with {len(counts)} animes built in {directory}")
+        except Exception as e:
+            logger.error(f"Error while building the anime rating index in {directory}")
+            raise CustomException("Failed to build anime rating index", e)
+        return cls.load(directory)
+
+    def save(self, directory):
+        try:
+            write_table(directory, {name: getattr(self, name) for name in ("starts", "stops", *self.DATA)})
+            logger.info(f"Anime rating index with {self.n_animes} animes saved to {directory}")
+        except Exception as e:
+            logger.error(f"Error while saving the anime rating index to {directory}")
+            raise CustomException("Failed to save anime rating index", e)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        arrays, _ = read_table(directory, mmap_mode=mmap_mode)
+        return cls(**arrays)
+
+    def ratings(self, rows):
+        """(user, anime, rating) arrays of every training rating of the encoded animes `rows`."""
+        lengths, positions = row_positions(self.starts, self.stops, rows)
+        return (np.asarray(self.user[positions], dtype=np.int64), np.repeat(np.asarray(rows, dtype=np.int64), lengths),
+                np.asarray(self.rating[positions]))
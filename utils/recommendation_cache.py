@@ -0,0 +1,142 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from src.logger import get_logger
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+WATCHED_DIRS = (WEIGHTS_DIR, PROCESSED_DIR)
+
+
+def artifact_version(directories=WATCHED_DIRS):
+    """Hash of the name, size and modification time of every file under `directories`."""
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Removed while we were walking
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+class RecommendationCache:
+    """Bounded LRU cache with optional TTL for recommendation results.
+
+    Entries are keyed on the call arguments plus the artifact version, and
+    the whole cache is dropped when files under the watched artifact
+    directories change, or when `version_fn` (e.g. the live bundle
+    version) returns something new. The version is re-checked at most once
+    every `check_interval` seconds so lookups do not stat the disk each time.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, check_interval=5.0, directories=WATCHED_DIRS, version_fn=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.directories = directories
+        self.version_fn = version_fn or (lambda: artifact_version(directories))
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = self.version_fn()
+        self._checked_at = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_config(cls, config, version_fn=None):
+        cache_config = config.get("cache", {})
+        return cls(
+            max_size=cache_config.get("max_size", 10000),
+            ttl=cache_config.get("ttl_seconds"),
+            check_interval=cache_config.get("check_interval_seconds", 5.0),
+            version_fn=version_fn,
+        )
+
+    @property
+    def version(self):
+        self._refresh_version()
+        return self._version
+
+    def _refresh_version(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        version = self.version_fn()
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                logger.info(f"Artifacts changed ({self._version[:8]} -> {version[:8]}), clearing {len(self._entries)} cached recommendations")
+                self._version = version
+                self._entries.clear()
+                self.invalidations += 1
+
+    def get(self, key):
+        """Returns (found, value) for `key` under the current artifact version."""
+        self._refresh_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((self._version, key))
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is None or now - stored_at <= self.ttl:
+                    self._entries.move_to_end((self._version, key))
+                    self.hits += 1
+                    return True, value
+                del self._entries[(self._version, key)]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            # Drop results computed against artifacts that changed meanwhile
+            if version is not None and version != self._version:
+                return
+            self._entries[(self._version, key)] = (value, time.monotonic())
+            self._entries.move_to_end((self._version, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        found, value = self.get(key)
+        if found:
+            return value
+        version = self._version
+        value = compute()
+        self.put(key, value, version=version)
+        return value
+
+    def refresh(self):
+        """Re-reads the artifact version now, dropping every entry if it changed."""
+        self._refresh_version(force=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "version": self._version,
+            }
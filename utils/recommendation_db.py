@@ -0,0 +1,110 @@
+import os
+import json
+import sqlite3
+import threading
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+
+class RecommendationDB:
+    """SQLite store of precomputed recommendations keyed by user id.
+
+    Besides the per-user rows it keeps the settings and artifact version
+    the results were computed with, so readers can tell whether they still
+    apply to the live model.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # Reconnect after fork and after the file was atomically replaced
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.stamp == self._stamp():
+            return connection
+        if connection is not None:
+            connection.close()
+        connection = sqlite3.connect(self.path)
+        self._local.connection = connection
+        self._local.stamp = self._stamp()
+        return connection
+
+    def _stamp(self):
+        try:
+            return os.getpid(), os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return os.getpid(), None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def create(self, metadata):
+        """Starts an empty database with the given metadata, replacing any old one."""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._local = threading.local()
+            connection = self._connection()
+            connection.execute("PRAGMA journal_mode=OFF")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("CREATE TABLE recommendations (user_id INTEGER PRIMARY KEY, payload TEXT NOT NULL)")
+            connection.executemany("INSERT INTO metadata VALUES (?, ?)",
+                                   [(key, json.dumps(value)) for key, value in metadata.items()])
+            connection.commit()
+            logger.info(f"Recommendation database created at {self.path}")
+        except Exception as e:
+            logger.error(f"Error while creating recommendation database {self.path}: {str(e)}")
+            raise CustomException("Failed to create recommendation database", e)
+
+    def write(self, results):
+        """Inserts the dicts returned by batch_hybrid_recommendation."""
+        connection = self._connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO recommendations VALUES (?, ?)",
+            [(result["user_id"], json.dumps(result["recommendations"]))
+             for result in results if "recommendations" in result],
+        )
+        connection.commit()
+
+    def metadata(self):
+        """Metadata of the current database file, re-read only when the file changes."""
+        stamp = self._stamp()
+        cached = getattr(self._local, "metadata", None)
+        if cached is None or cached[0] != stamp:
+            rows = self._connection().execute("SELECT key, value FROM metadata").fetchall()
+            cached = (stamp, {key: json.loads(value) for key, value in rows})
+            self._local.metadata = cached
+        return cached[1]
+
+    def get(self, user_id):
+        """Precomputed recommendations for one user, or None."""
+        row = self._connection().execute(
+            "SELECT payload FROM recommendations WHERE user_id = ?", (int(user_id),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, user_ids):
+        """{user_id: recommendations} for the users that have precomputed rows."""
+        found = {}
+        user_ids = [int(user_id) for user_id in user_ids]
+        for start in range(0, len(user_ids), 900):  # Stay under SQLite's variable limit
+            chunk = user_ids[start:start + 900]
+            rows = self._connection().execute(
+                f"SELECT user_id, payload FROM recommendations WHERE user_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update((user_id, json.loads(payload)) for user_id, payload in rows)
+        return found
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local = threading.local()
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM recommendations").fetchone()[0]
@@ -0,0 +1,356 @@
+import os
+import threading
+import contextvars
+from contextlib import contextmanager
+import joblib
+import numpy as np
+import pandas as pd
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from config.paths_config import *
+from utils.anime_catalog import AnimeCatalog, MISSING
+from utils.rating_index import UserRatingIndex
+from utils.liked_matrix import LikedMatrix
+from utils.similarity import SimilarityEngine
+from utils.ann_index import IVFIndex
+from utils.neighbour_table import NeighbourTable, weights_fingerprint
+from utils.embeddings import load_embeddings
+from utils.columnar import DenseMap, table_exists, read_table
+from utils.common_functions import read_yaml
+from utils.artifact_bundle import current_bundle, verify_bundle
+from utils.recommendation_cache import artifact_version
+
+logger = get_logger(__name__)
+
+# Every artifact the serving path reads, keyed by a short name. rating_df is
+# only read when no saved CSR rating index exists, the pickled weights only
+# when no memory-mapped embedding file exists, and the pickled encoders only
+# when no columnar encoder table exists.
+SERVING_ARTIFACTS = {
+    "user2user_encoded": USER2USER_ENCODED,
+    "user2user_decoded": USER2USER_DECODED,
+    "anime2anime_encoded": ANIME2ANIME_ENCODED,
+    "anime2anime_decoded": ANIME2ANIME_DECODED,
+    "anime_df": DF_PATH,
+    "synopsis_df": DF_SYNOPSIS,
+}
+
+# Memory-mappable embedding files saved by ModelTraining for each pickle
+EMBEDDING_FILES = {
+    os.path.normpath(USER_WEIGHTS): USER_EMBEDDINGS,
+    os.path.normpath(ANIME_WEIGHTS): ANIME_EMBEDDINGS,
+}
+
+# ANN indexes saved by ModelTraining next to each embedding table
+ANN_INDEXES = {
+    os.path.normpath(USER_WEIGHTS): ANN_INDEX_USER,
+    os.path.normpath(ANIME_WEIGHTS): ANN_INDEX_ANIME,
+}
+
+# (values column, keys column) of the encoder table standing in for each pickled dict
+COLUMNAR_MAPS = {
+    os.path.normpath(USER2USER_ENCODED): ("user_encoder", "user_decoder"),
+    os.path.normpath(USER2USER_DECODED): ("user_decoder", None),
+    os.path.normpath(ANIME2ANIME_ENCODED): ("anime_encoder", "anime_decoder"),
+    os.path.normpath(ANIME2ANIME_DECODED): ("anime_decoder", None),
+}
+
+
+def _artifact_key(path):
+    return os.path.normpath(path)
+
+
+def _read_artifact(path, resolve=lambda path: path):
+    """Reads the artifact known as `path` from `resolve(path)`."""
+    columns = COLUMNAR_MAPS.get(_artifact_key(path))
+    if columns and table_exists(resolve(ENCODERS_TABLE)):
+        values, keys = columns
+        data, _ = read_table(resolve(ENCODERS_TABLE), columns=[name for name in columns if name])
+        return DenseMap(data[values], data[keys] if keys else None)
+    if path.endswith(".csv"):
+        return pd.read_csv(resolve(path))
+    return joblib.load(resolve(path))
+
+
+class RecommenderStore:
+    """Process-wide, in-memory copy of the serving artifacts.
+
+    Artifacts are read from disk once and then shared by every request.
+    Lookups are keyed by path so the helpers can keep their path arguments.
+    With `root` set, every path under artifacts/ is read from that
+    directory instead, e.g. a published bundle tagged `version`.
+    """
+
+    def __init__(self, artifacts=None, config_path=CONFIG_PATH, root=None, version=None):
+        self.artifacts = dict(artifacts or SERVING_ARTIFACTS)
+        self.config = read_yaml(config_path) if os.path.exists(config_path) else {}
+        self.root = root
+        self.version = version
+        self._data = {}
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Eagerly loads every serving artifact."""
+        try:
+            for name, path in self.artifacts.items():
+                self.get(path)
+                logger.info(f"{name} loaded into the recommender store from {path}")
+            self.catalog()
+            self.rating_index()
+            self.liked_matrix().csr()
+            self.similarity(USER_WEIGHTS)
+            self.similarity(ANIME_WEIGHTS)
+            self.anime_neighbours()
+            self.anime_decoder()
+            return self
+        except Exception as e:
+            logger.error("Error while loading the recommender store")
+            raise CustomException("Failed to load the recommender store", e)
+
+    def path(self, path):
+        """Where `path` is read from: under `root` for artifacts/ paths when a root is set."""
+        if self.root is None:
+            return path
+        relative = os.path.relpath(os.path.normpath(path), ARTIFACTS_DIR)
+        return path if relative.startswith("..") else os.path.join(self.root, relative)
+
+    def get(self, path):
+        """Returns the artifact stored at `path`, reading it on first use."""
+        key = _artifact_key(path)
+        data = self._data.get(key)
+        if data is None:
+            with self._lock:
+                data = self._data.get(key)
+                if data is None:
+                    data = _read_artifact(path, self.path)
+                    self._data[key] = data
+        return data
+
+    def derived(self, key, build):
+        """Returns a structure built from loaded artifacts, building it once."""
+        data = self._derived.get(key)
+        if data is None:
+            with self._lock:
+                data = self._derived.get(key)
+                if data is None:
+                    data = build()
+                    self._derived[key] = data
+        return data
+
+    def catalog(self, path_df=DF_PATH, path_synopsis=DF_SYNOPSIS):
+        """Hash-indexed anime catalog over anime_df and synopsis_df."""
+        key = ("catalog", _artifact_key(path_df), _artifact_key(path_synopsis))
+        return self.derived(key, lambda: AnimeCatalog(self.get(path_df), self.get(path_synopsis)))
+
+    def rating_index(self, path_rating_df=RATING_DF):
+        """Per-user CSR rating index, rebuilt from rating_df if it was never saved."""
+        key = ("rating_index", _artifact_key(path_rating_df))
+
+        def build():
+            if _artifact_key(path_rating_df) == _artifact_key(RATING_DF) and os.path.isdir(self.path(RATING_INDEX_DIR)):
+                return UserRatingIndex.load(self.path(RATING_INDEX_DIR))
+            logger.info(f"No saved rating index for {path_rating_df}, building it from the CSV")
+            return UserRatingIndex.from_frame(self.get(path_rating_df))
+
+        return self.derived(key, build)
+
+    def liked_matrix(self, path_rating_df=RATING_DF):
+        """Sparse user x anime matrix of liked animes, built from the rating index if it was never saved."""
+        key = ("liked_matrix", _artifact_key(path_rating_df))
+
+        def build():
+            rating_index = self.rating_index(path_rating_df)
+            if _artifact_key(path_rating_df) == _artifact_key(RATING_DF) and table_exists(self.path(LIKED_TABLE)):
+                liked = LikedMatrix.load(self.path(LIKED_TABLE))
+                if liked.n_users == rating_index.n_users:
+                    return liked
+                logger.warning("Liked matrix does not match the rating index, rebuilding it")
+            return LikedMatrix.from_rating_index(rating_index, n_animes=len(self.anime_decoder()))
+
+        return self.derived(key, build)
+
+    def anime_decoder(self, path_anime2anime_decoded=ANIME2ANIME_DECODED):
+        """Dense array mapping encoded anime rows to anime ids."""
+        key = ("anime_decoder", _artifact_key(path_anime2anime_decoded))
+
+        def build():
+            anime2anime_decoded = self.get(path_anime2anime_decoded)
+            if isinstance(anime2anime_decoded, DenseMap):
+                return np.asarray(anime2anime_decoded.values_array, dtype=np.int64)
+            decoder = np.full(len(anime2anime_decoded), MISSING, dtype=np.int64)
+            decoder[list(anime2anime_decoded.keys())] = list(anime2anime_decoded.values())
+            return decoder
+
+        return self.derived(key, build)
+
+    def embeddings(self, path_weights):
+        """Embedding table for `path_weights`, memory-mapped when a .npy copy exists."""
+        key = ("embeddings", _artifact_key(path_weights))
+
+        def build():
+            embedding_path = EMBEDDING_FILES.get(_artifact_key(path_weights))
+            if embedding_path and os.path.exists(self.path(embedding_path)):
+                return load_embeddings(self.path(embedding_path))
+            return self.get(path_weights)
+
+        return self.derived(key, build)
+
+    def similarity(self, path_weights):
+        """Top-k engine over an embedding table: the IVF index when one was built, else exact search."""
+        key = ("similarity", _artifact_key(path_weights))
+
+        def build():
+            weights = self.embeddings(path_weights)
+            ann_config = self.config.get("ann", {})
+            index_path = ANN_INDEXES.get(_artifact_key(path_weights))
+            if ann_config.get("enabled", False) and index_path and os.path.exists(self.path(index_path)):
+                return IVFIndex.load(self.path(index_path), weights, n_probe=ann_config.get("n_probe"))
+            return SimilarityEngine(weights)
+
+        return self.derived(key, build)
+
+    def anime_neighbours(self, path_anime_weights=ANIME_WEIGHTS):
+        """Precomputed anime-to-anime neighbour table, or None if it is missing or stale."""
+        key = ("anime_neighbours", _artifact_key(path_anime_weights))
+
+        def build():
+            if _artifact_key(path_anime_weights) != _artifact_key(ANIME_WEIGHTS) or not os.path.exists(self.path(ANIME_NEIGHBOUR_IDS)):
+                return False
+            table = NeighbourTable.load(self.path(ANIME_NEIGHBOUR_IDS), self.path(ANIME_NEIGHBOUR_SCORES),
+                                        self.path(ANIME_NEIGHBOUR_META))
+            weights_path = self.path(path_anime_weights)
+            fingerprint = weights_fingerprint(weights_path) if os.path.exists(weights_path) else None
+            if table.ids.shape[0] != len(self.embeddings(path_anime_weights)) \
+                    or table.meta.get("weights_fingerprint") != fingerprint:
+                # Also catches a table left over from weights retrained with the same anime count
+                logger.warning("Anime neighbour table was not built from the current anime weights, ignoring it")
+                return False
+            return table
+
+        return self.derived(key, build) or None
+
+    def __getattr__(self, name):
+        artifacts = self.__dict__.get("artifacts", {})
+        if name in artifacts:
+            return self.get(artifacts[name])
+        raise AttributeError(name)
+
+
+_store = None
+_store_lock = threading.Lock()
+_pinned = contextvars.ContextVar("pinned_store", default=None)
+
+
+def _new_store():
+    """Store over the current published bundle, or over artifacts/ when none was published."""
+    bundle = current_bundle()
+    if bundle is None:
+        return RecommenderStore()
+    version, path = bundle
+    return RecommenderStore(root=path, version=version)
+
+
+def get_store():
+    """Returns the process-wide RecommenderStore, or the one pinned by `pinned_store`."""
+    global _store
+    pinned = _pinned.get()
+    if pinned is not None:
+        return pinned
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _new_store()
+    return _store
+
+
+def load_store():
+    """Creates the process-wide store and loads all artifacts into it."""
+    return get_store().load()
+
+
+def swap_store(store):
+    """Makes `store` the process-wide store; requests already running keep the one they pinned."""
+    global _store
+    with _store_lock:
+        previous, _store = _store, store
+    return previous
+
+
+@contextmanager
+def pinned_store():
+    """Serves every get_store() call inside the block from the same store, even across a swap."""
+    token = _pinned.set(get_store())
+    try:
+        yield _pinned.get()
+    finally:
+        _pinned.reset(token)
+
+
+def live_version():
+    """Version of the artifacts being served: the bundle version, else a hash of artifacts/."""
+    return get_store().version or artifact_version()
+
+
+class StoreReloader:
+    """Background thread that hot-swaps the store when a new bundle is published.
+
+    The new store is built and fully loaded on this thread, off the
+    request path, and only then swapped in with one reference assignment.
+    Requests in flight finish on the store they started with, so none is
+    dropped or sees a mix of versions. A bundle that fails to load is
+    logged and the live store keeps serving. Each `on_swap` callback is
+    called with the new version right after a swap, e.g. to drop caches
+    keyed on the old one.
+    """
+
+    def __init__(self, poll_interval=5.0, on_swap=()):
+        self.poll_interval = poll_interval
+        self.on_swap = list(on_swap)
+        self.reloads = 0
+        self.failures = 0
+        self._failed_version = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, on_swap=()):
+        return cls(poll_interval=config.get("serving", {}).get("poll_interval_seconds", 5.0), on_swap=on_swap)
+
+    def check(self):
+        """Loads and swaps in the current bundle if it differs from the live one. Returns whether it did."""
+        bundle = current_bundle()
+        if bundle is None or bundle[0] in (get_store().version, self._failed_version):
+            return False
+        version, path = bundle
+        try:
+            verify_bundle(path)
+            store = RecommenderStore(root=path, version=version).load()
+        except Exception as e:
+            self.failures += 1
+            self._failed_version = version
+            logger.error(f"Could not load artifact bundle {version}, still serving {get_store().version}: {str(e)}")
+            return False
+        previous = swap_store(store)
+        self.reloads += 1
+        logger.info(f"Swapped artifact bundle {previous.version if previous else None} -> {version}")
+        for callback in self.on_swap:
+            try:
+                callback(version)
+            except Exception as e:
+                logger.error(f"Callback {getattr(callback, '__name__', callback)} failed after swapping in {version}: {str(e)}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.check()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="store-reloader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
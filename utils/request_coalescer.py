@@ -0,0 +1,128 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _Pending:
+    __slots__ = ("item", "future", "enqueued_at")
+
+    def __init__(self, item):
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class RequestCoalescer:
+    """Gathers concurrent single-item calls into batches for `batch_fn`.
+
+    A worker thread waits up to `max_wait_ms` after the first queued item,
+    or until `max_batch_size` items are queued, then calls
+    `batch_fn(items)` once and hands each caller its own result.
+    `batch_fn` must return one result per item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=64, max_wait_ms=5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self.batches = 0
+        self.requests = 0
+        self.errors = 0
+        self.batch_size_counts = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    @classmethod
+    def from_config(cls, batch_fn, config):
+        coalescer_config = config.get("coalescer", {})
+        return cls(
+            batch_fn,
+            max_batch_size=coalescer_config.get("max_batch_size", 64),
+            max_wait_ms=coalescer_config.get("max_wait_ms", 5.0),
+        )
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="request-coalescer", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, item):
+        """Queues `item` and returns a Future for its result."""
+        self._ensure_worker()
+        pending = _Pending(item)
+        self._queue.put(pending)
+        return pending.future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0].enqueued_at + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch):
+        started_at = time.monotonic()
+        delays = [started_at - pending.enqueued_at for pending in batch]
+        try:
+            results = self.batch_fn([pending.item for pending in batch])
+            for pending, result in zip(batch, results):
+                pending.future.set_result(result)
+        except Exception as e:
+            logger.error(f"Coalesced batch of {len(batch)} failed: {str(e)}")
+            with self._lock:
+                self.errors += 1
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+        self._record(len(batch), delays)
+
+    def _record(self, size, delays):
+        with self._lock:
+            self.batches += 1
+            self.requests += size
+            for bucket in BATCH_SIZE_BUCKETS:
+                if size <= bucket:
+                    self.batch_size_counts[bucket] += 1
+                    break
+            else:
+                self.batch_size_counts[float("inf")] = self.batch_size_counts.get(float("inf"), 0) + 1
+            self.queue_delay_total += sum(delays)
+            self.queue_delay_max = max(self.queue_delay_max, max(delays))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "errors": self.errors,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "batch_size_counts": dict(self.batch_size_counts),
+                "mean_queue_delay_ms": 1000 * self.queue_delay_total / self.requests if self.requests else 0.0,
+                "max_queue_delay_ms": 1000 * self.queue_delay_max,
+            }
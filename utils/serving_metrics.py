@@ -0,0 +1,162 @@
+import time
+import bisect
+import itertools
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# (type, help) of every metric recorded through ServingMetrics
+METRICS = {
+    "recommender_stage_seconds": ("histogram", "Time spent in one recommendation stage."),
+    "recommender_stage_errors_total": ("counter", "Recommendation stages that raised or found nothing."),
+    "recommender_request_seconds": ("histogram", "End-to-end latency of HTTP requests."),
+    "recommender_requests_total": ("counter", "HTTP requests handled."),
+    "recommender_request_errors_total": ("counter", "HTTP requests that failed."),
+    "recommender_served_total": ("counter", "Recommendations served, by where they came from."),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class ServingMetrics:
+    """In-process latency histograms and counters, rendered in the Prometheus text format.
+
+    Recording is a bisect plus a few additions under one lock, a few
+    microseconds per span, so it can stay on in production. Values from
+    other components (cache, coalescer, ...) are read at scrape time from
+    registered collectors. Every process keeps its own numbers.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+
+    def observe(self, name, value, **labels):
+        """Adds one observation to the histogram `name`."""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def inc(self, name, value=1, **labels):
+        """Increments the counter `name`."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage):
+        """Times the enclosed block as `stage`, counting an error if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("recommender_stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("recommender_stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def timed(self, stage):
+        """Decorator form of `span`."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def request(self, endpoint):
+        """Counts and times one HTTP request to `endpoint`; an exception counts as an error."""
+        start = time.perf_counter()
+        self.inc("recommender_requests_total", endpoint=endpoint)
+        try:
+            yield
+        except Exception:
+            self.inc("recommender_request_errors_total", endpoint=endpoint)
+            raise
+        finally:
+            self.observe("recommender_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+
+    def register_collector(self, collect):
+        """Adds a callable returning (name, type, help, labels dict, value) samples read at scrape time.
+
+        For a histogram sample, value is {"buckets": [(upper bound, cumulative count), ...], "sum": total}.
+        """
+        self._collectors.append(collect)
+
+    @staticmethod
+    def _histogram_lines(name, labels, buckets, total):
+        """Exposition lines of one histogram from (upper bound, cumulative count) pairs."""
+        lines = [f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}" for bound, count in buckets]
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {buckets[-1][1] if buckets else 0}")
+        return lines
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+            counters = dict(self._counters)
+
+        families = {}
+        for (name, labels), value in counters.items():
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (counts, total) in sorted(histograms.items()):
+            cumulative = itertools.accumulate(counts)
+            families.setdefault(name, []).extend(
+                self._histogram_lines(name, labels, list(zip(self.buckets + ("+Inf",), cumulative)), total))
+
+        described = dict(METRICS)
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {str(e)}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                described.setdefault(name, (kind, help_text))
+                labels = tuple(sorted(labels.items()))
+                if kind == "histogram":
+                    # value is {"buckets": [(upper bound, cumulative count), ...], "sum": total}
+                    families.setdefault(name, []).extend(
+                        self._histogram_lines(name, labels, value["buckets"], value["sum"]))
+                else:
+                    families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        output = []
+        for name in sorted(families):
+            kind, help_text = described.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(sorted(families[name]) if kind != "histogram" else families[name])
+        return "\n".join(output) + "\n"
+
+
+serving_metrics = ServingMetrics()
@@ -0,0 +1,61 @@
+import numpy as np
+from src.logger import get_logger
+from utils.embeddings import as_embedding_table
+
+logger = get_logger(__name__)
+
+
+class SimilarityEngine:
+    """Batched top-k inner-product search over an L2-normalized embedding table.
+
+    A batch of queries is scored with one matrix-matrix product and the
+    neighbours are picked with `np.argpartition`, so no full sort of the
+    table is ever done.
+    """
+
+    def __init__(self, weights, block_size=1024):
+        self.weights = as_embedding_table(weights)
+        self.block_size = block_size
+
+    @property
+    def n_items(self):
+        return self.weights.shape[0]
+
+    def scores(self, rows):
+        """Similarity of every item to each query row, shape (len(rows), n_items)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return self.weights.dot(self.weights.rows(rows))
+
+    def top_k(self, rows, k, neg=False, exclude_self=False):
+        """Returns (ids, scores) of the k nearest items for every query row.
+
+        Results are ordered most similar first, or least similar first when
+        `neg` is set. With `exclude_self` a query never returns its own row.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        k = max(0, min(k, self.n_items - int(exclude_self)))
+        ids = np.empty((len(rows), k), dtype=np.int64)
+        scores = np.empty((len(rows), k), dtype=self.weights.dtype)
+        if k == 0:
+            return ids, scores
+
+        for start in range(0, len(rows), self.block_size):
+            block = rows[start:start + self.block_size]
+            sims = self.scores(block)
+
+            # Smallest key first: negate for nearest, keep as is for farthest
+            key = sims.copy() if neg else -sims
+            if exclude_self:
+                key[np.arange(len(block)), block] = np.inf
+
+            if k < self.n_items:
+                candidates = np.argpartition(key, k - 1, axis=1)[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(self.n_items), key.shape)
+
+            order = np.argsort(np.take_along_axis(key, candidates, axis=1), axis=1, kind="stable")
+            block_ids = np.take_along_axis(candidates, order, axis=1)
+            ids[start:start + len(block)] = block_ids
+            scores[start:start + len(block)] = np.take_along_axis(sims, block_ids, axis=1)
+
+        return ids, scores
@@ -0,0 +1,57 @@
+import time
+import resource
+import numpy as np
+from tensorflow.keras.callbacks import Callback
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def peak_memory_mb():
+    """High-water mark of this process's resident memory (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class TrainingMetrics(Callback):
+    """Records per-epoch training speed and memory and sends it to a MetricsLogger.
+
+    Per epoch: wall time, samples/s, step-time p50/p90/p99 and the peak
+    resident memory so far. Per-step work is two clock reads, and metrics
+    are only queued, so the training loop is not slowed down.
+    """
+
+    def __init__(self, metrics_logger, batch_size, samples_per_epoch=None):
+        super().__init__()
+        self.metrics_logger = metrics_logger
+        self.batch_size = batch_size
+        self.samples_per_epoch = samples_per_epoch
+        self.history = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._step_times = []
+        self._epoch_start = time.perf_counter()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._step_times.append(time.perf_counter() - self._step_start)
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_time = time.perf_counter() - self._epoch_start
+        steps = len(self._step_times)
+        samples = steps * self.batch_size
+        if self.samples_per_epoch:
+            samples = min(samples, self.samples_per_epoch)
+        step_ms = 1000 * np.asarray(self._step_times) if steps else np.zeros(1)
+        metrics = {
+            "epoch_seconds": epoch_time,
+            "samples_per_second": samples / epoch_time if epoch_time > 0 else 0.0,
+            "step_ms_p50": float(np.percentile(step_ms, 50)),
+            "step_ms_p90": float(np.percentile(step_ms, 90)),
+            "step_ms_p99": float(np.percentile(step_ms, 99)),
+            "peak_memory_mb": peak_memory_mb(),
+        }
+        self.history.append(metrics)
+        self.metrics_logger.log_metrics(metrics, step=epoch)
+        logger.info(f"Epoch {epoch + 1} throughput: " + ", ".join(f"{name}={value:.2f}" for name, value in metrics.items()))